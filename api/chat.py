@@ -1,6 +1,8 @@
 from fastapi import APIRouter, HTTPException, Body
-from typing import List, Dict
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, AsyncIterator
 from pydantic import BaseModel
+import json
 
 from services.ai_service import ai_service
 
@@ -25,6 +27,31 @@ async def chat_with_teacher(req: ChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse_response(chunks: AsyncIterator[str]) -> StreamingResponse:
+    """Wrap text chunks as Server-Sent Events: data frames, then a done/error event."""
+    async def event_stream():
+        try:
+            async for chunk in chunks:
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/chat/stream")
+async def chat_with_teacher_stream(req: ChatRequest):
+    """Streaming chat: sends the teacher's reply token by token over SSE."""
+    if not ai_service.has_ai:
+        raise HTTPException(status_code=400, detail="AI not configured")
+    
+    return _sse_response(ai_service.stream_chat_with_teacher(req.history, req.message))
+
 @router.post("/explain")
 async def explain_concept(
     text: str = Body(..., embed=True),
@@ -39,3 +66,23 @@ async def explain_concept(
         return {"explanation": explanation}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/explain/stream")
+async def explain_concept_stream(
+    text: str = Body(..., embed=True),
+    context: str = Body(None, embed=True)
+):
+    """Streaming explanation over SSE."""
+    if not ai_service.has_ai:
+        raise HTTPException(status_code=400, detail="AI not configured")
+    
+    return _sse_response(ai_service.stream_explain_concept(text, context))
+
+@router.get("/providers")
+async def provider_status():
+    """Circuit-breaker state and live ranking of the AI providers."""
+    health = ai_service.get_provider_health()
+    return {
+        "providers": health,
+        "ranking": sorted(health, key=lambda name: health[name]["score"])
+    }
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, HTTPException
+
+from services.job_queue import job_queue, SUCCEEDED, FAILED
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+def job_accepted(job_id: str, token: str) -> dict:
+    """Response body for endpoints that hand their work to the job queue.
+
+    The URLs carry the job's access token; only whoever holds them can poll the job.
+    """
+    return {
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}?token={token}",
+        "result_url": f"/jobs/{job_id}/result?token={token}",
+    }
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, token: str):
+    """Poll a background job's status (needs the token it was submitted with)."""
+    job = await job_queue.get(job_id, token)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str, token: str):
+    """A finished job's JSON result."""
+    job = await job_queue.get(job_id, token)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=job.get("error") or "Job failed")
+    if job["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return job.get("result")
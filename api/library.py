@@ -3,31 +3,23 @@ from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
 
-from database import get_db
+from database import get_db, SessionLocal
 from models.user_models import User, LibraryItem
 from api.auth import get_current_user
 from services.ai_service import ai_service
-from utils.file_processing import extract_text_from_file
+from services.file_service import file_service
+from services.upload_service import StoredUpload, UploadTooLarge, upload_service
+from services.job_queue import job_queue
+from api.jobs import job_accepted
 
 router = APIRouter(prefix="/library", tags=["Library"])
 
-@router.post("/upload")
-async def upload_file(
-    file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Upload a file, extract text, summarize it, and save to Library."""
+async def run_library_upload_job(payload: dict) -> dict:
+    """Job handler: extract, summarize and save an uploaded file to the Library."""
+    upload = StoredUpload(payload["filename"], payload["path"], payload["size"], payload["sha256"])
     
-    # 1. Read & Extract
-    try:
-        content = await file.read()
-        text_content = extract_text_from_file(file.filename, content)
-        
-        # Limit text content for storage if needed, but keeping full for now
-        # meaningful_content = text_content[:20000] 
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"File processing failed: {str(e)}")
+    # 1. Extract
+    text_content = await file_service.extract_full(upload)
 
     # 2. Summarize (AI)
     summary = "No summary available."
@@ -39,23 +31,62 @@ async def upload_file(
             summary = "AI summarization failed, but file is saved."
 
     # 3. Save to DB
-    new_item = LibraryItem(
-        filename=file.filename,
-        content=text_content,
-        summary=summary,
-        file_type=file.filename.split('.')[-1],
-        owner_id=current_user.id
-    )
-    db.add(new_item)
-    db.commit()
-    db.refresh(new_item)
+    db = SessionLocal()
+    try:
+        new_item = LibraryItem(
+            filename=upload.filename,
+            content=text_content,
+            summary=summary,
+            file_type=upload.extension,
+            owner_id=payload["owner_id"]
+        )
+        db.add(new_item)
+        db.commit()
+        db.refresh(new_item)
+        item_id = new_item.id
+    finally:
+        db.close()
 
     return {
         "message": "File uploaded successfully",
-        "item_id": new_item.id,
+        "item_id": item_id,
         "summary": summary
     }
 
+def _remove_job_upload(payload: dict):
+    StoredUpload(payload["filename"], payload["path"], payload["size"], payload["sha256"]).remove()
+
+job_queue.register("library_upload", run_library_upload_job, cleanup=_remove_job_upload)
+
+
+@router.post("/upload", status_code=202)
+async def upload_file(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """Upload a file; extraction, summary and saving run as a background job.
+    
+    Poll /jobs/{job_id}; its result holds the new item_id and summary.
+    """
+    try:
+        upload = await upload_service.ingest(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    payload = {
+        "filename": upload.filename,
+        "path": upload.path,
+        "size": upload.size,
+        "sha256": upload.sha256,
+        "owner_id": current_user.id,
+    }
+    try:
+        job_id, token = await job_queue.submit("library_upload", payload, owner=str(current_user.id))
+    except Exception as e:
+        upload.remove()
+        raise HTTPException(status_code=500, detail=f"File processing failed: {str(e)}")
+    return job_accepted(job_id, token)
+
 @router.get("/", response_model=List[dict])
 def get_library(
     current_user: User = Depends(get_current_user),
@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Body, UploadFile, File, Form
 from sqlalchemy.orm import Session
 from datetime import datetime
+import hashlib
 
 from database import get_db
 from models.user_models import User, QuizResult
 from api.models import TopicQuizRequest
 from api.auth import get_current_user
 from services.ai_service import ai_service
-from utils.file_processing import extract_text_from_file
+from services.question_bank import question_bank, merge_questions
+from services.file_service import file_service
+from services.upload_service import UploadTooLarge, upload_service
+from utils.context_selector import filename_query, select_context
 
 router = APIRouter(prefix="/quiz", tags=["Quiz"])
 
@@ -65,9 +69,28 @@ async def generate_quiz(
     if current_user.level > 5 and difficulty == "easy":
         difficulty = "medium"
     
+    # Topic quizzes are assembled from the question bank first (unseen
+    # questions only); context-specific quizzes always go to the AI. Every
+    # guest shares the placeholder user, so guests get no seen history.
+    user_key = None if current_user.role == "guest" else str(current_user.id)
+    bank_questions = []
+    if not req.context:
+        bank_questions = await question_bank.sample(
+            req.topic, req.language, difficulty, "single_only", req.num_questions,
+            mastery_level=req.mastery_level, user_key=user_key
+        )
+    needed = req.num_questions - len(bank_questions)
+    if needed <= 0:
+        return {
+            "questions": bank_questions[:req.num_questions],
+            "adjusted_difficulty": difficulty,
+            "user_level": current_user.level,
+            "provider": "question_bank"
+        }
+    
     prompt = _build_quiz_prompt(
         topic=req.topic,
-        num_questions=req.num_questions,
+        num_questions=needed,
         difficulty=difficulty,
         language=req.language,
         user_level=current_user.level,
@@ -75,8 +98,33 @@ async def generate_quiz(
         context=req.context
     )
     
+    # The prompt only depends on the user's level for Intermediate mastery
+    level_specific = req.mastery_level not in ("Beginner", "Advanced", "Exam")
+    cache_key = ai_service.make_cache_key(
+        "quiz_generate",
+        topic=req.topic,
+        difficulty=difficulty,
+        language=req.language,
+        count=needed,
+        mastery_level=req.mastery_level,
+        user_level=current_user.level if level_specific else None,
+        context=hashlib.sha256(req.context.encode()).hexdigest() if req.context else None
+    )
+    
     try:
-        questions = await ai_service.generate_quiz(prompt)
+        # No offline fallback here: offline questions must not enter the bank.
+        # Topic quizzes skip the response cache: the bank already caches
+        # questions, and a cached answer could repeat ones the user has seen.
+        questions = await ai_service.generate_quiz(
+            prompt, allow_fallback=False, cache_key=cache_key, use_cache=bool(req.context)
+        )
+        questions = ai_service.validate_question_types(questions, "single_only")
+        if not req.context:
+            await question_bank.add(
+                questions, req.topic, req.language, difficulty,
+                mastery_level=req.mastery_level, seen_by=user_key
+            )
+        questions = merge_questions(bank_questions, questions)[:req.num_questions]
         return {
             "questions": questions, 
             "adjusted_difficulty": difficulty,
@@ -88,10 +136,10 @@ async def generate_quiz(
         print(f"Quiz generation error: {e}")
         
         # Return offline quiz with informative message
-        offline_quiz = ai_service.generate_offline_quiz(req.topic, req.num_questions, difficulty)
+        offline_quiz = ai_service.generate_offline_quiz(req.topic, needed, difficulty)
         return {
             "message": "⚡ Using backup AI for uninterrupted learning",
-            "questions": offline_quiz,
+            "questions": bank_questions + offline_quiz,
             "adjusted_difficulty": difficulty,
             "user_level": current_user.level,
             "provider": "offline"
@@ -110,11 +158,18 @@ async def generate_quiz_from_file(
     # AI is always available with offline fallback
     
     try:
-        content = await file.read()
-        text_content = extract_text_from_file(file.filename, content)
+        upload = await upload_service.ingest(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    try:
+        try:
+            text_content = await file_service.extract_for_prompt(upload)
+        finally:
+            upload.remove()
         
-        # Limit text content to avoid token limits (approx 10k chars for safety)
-        text_content = text_content[:15000]
+        # Send the most salient parts of the document that fit the provider's budget
+        text_content = select_context(text_content, filename_query(file.filename), ai_service.context_budget())
         
         prompt = _build_quiz_prompt(
             topic=f"the uploaded document ({file.filename})",
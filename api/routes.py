@@ -1,10 +1,19 @@
+import json
 import os
-import shutil
+from typing import Dict, List, Optional
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from fastapi.responses import StreamingResponse
 from .models import TopicQuizRequest, TeacherHelpRequest, AIHelpRequest
 from services.ai_service import ai_service
 from services.file_service import file_service
+from services.upload_service import UploadTooLarge, upload_service
+from services.job_queue import job_queue
+from services.render_service import render_service
+from services.artifact_cache import artifact_cache
+from services.question_bank import question_bank, merge_questions, shortfall_split, type_distribution
 from utils.helpers import get_random_quote
+from utils.startup_timer import startup_timer
+from utils.context_selector import filename_query, select_context
 
 from utils.limiter import limiter
 
@@ -13,35 +22,21 @@ router = APIRouter()
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-@router.get("/health")
-async def health():
-    return {
-        "status": "healthy",
-        "ai_status": ai_service.status,
-        "provider": ai_service.provider
-    }
+# Map user-facing question types to strict modes
+MODE_MAPPING = {
+    "Single Choice": "single_only",
+    "Multiple Choice": "multi_only",
+    "True/False": "truefalse_only",
+    "Mixed": "mixed"
+}
 
-@router.post("/generate_topic")
-@limiter.limit("5/minute")
-async def generate_topic(req: TopicQuizRequest, request: Request):
-    if not ai_service.has_ai:
-        raise HTTPException(status_code=400, detail="AI not configured")
-    
-    # Map user-facing question types to strict modes
-    MODE_MAPPING = {
-        "Single Choice": "single_only",
-        "Multiple Choice": "multi_only",
-        "True/False": "truefalse_only",
-        "Mixed": "mixed"
-    }
-    
-    mode = MODE_MAPPING.get(req.question_type, "single_only")
-    
+def _build_topic_prompt(topic: str, num_questions: int, difficulty: str, language: str, mode: str,
+                        split: Optional[Dict[str, int]] = None) -> str:
     # Generate strict mode-specific prompts
     if mode == "single_only":
         prompt = f"""
-        Generate {req.num_questions} HIGH-QUALITY SINGLE-CHOICE questions about "{req.topic}" in {req.language}.
-        Difficulty: {req.difficulty}
+        Generate {num_questions} HIGH-QUALITY SINGLE-CHOICE questions about "{topic}" in {language}.
+        Difficulty: {difficulty}
         
         QUALITY STANDARDS (CRITICAL):
         ✓ Questions must be CLEAR, UNAMBIGUOUS, and PROFESSIONALLY WRITTEN
@@ -70,7 +65,7 @@ async def generate_topic(req: TopicQuizRequest, request: Request):
         [
             {{
                 "type": "single",
-                "prompt": "Clear, professional question in {req.language}...",
+                "prompt": "Clear, professional question in {language}...",
                 "choices": ["Option A", "Option B", "Option C", "Option D"],
                 "answer": "Option A",
                 "explanation": "Comprehensive explanation covering why this is correct and the underlying concept..."
@@ -80,8 +75,8 @@ async def generate_topic(req: TopicQuizRequest, request: Request):
     
     elif mode == "multi_only":
         prompt = f"""
-        Generate {req.num_questions} HIGH-QUALITY MULTIPLE-CHOICE questions about "{req.topic}" in {req.language}.
-        Difficulty: {req.difficulty}
+        Generate {num_questions} HIGH-QUALITY MULTIPLE-CHOICE questions about "{topic}" in {language}.
+        Difficulty: {difficulty}
         
         QUALITY STANDARDS (CRITICAL):
         ✓ Questions must be CLEAR and test DEEP UNDERSTANDING
@@ -107,7 +102,7 @@ async def generate_topic(req: TopicQuizRequest, request: Request):
         [
             {{
                 "type": "multi",
-                "prompt": "Professional question requiring analysis in {req.language}...",
+                "prompt": "Professional question requiring analysis in {language}...",
                 "choices": ["Option A", "Option B", "Option C", "Option D", "Option E"],
                 "correct_answers": ["Option A", "Option C"],
                 "explanation": "Comprehensive explanation of why A and C are correct and why others are not..."
@@ -117,8 +112,8 @@ async def generate_topic(req: TopicQuizRequest, request: Request):
     
     elif mode == "truefalse_only":
         prompt = f"""
-        Generate {req.num_questions} HIGH-QUALITY TRUE/FALSE questions about "{req.topic}" in {req.language}.
-        Difficulty: {req.difficulty}
+        Generate {num_questions} HIGH-QUALITY TRUE/FALSE questions about "{topic}" in {language}.
+        Difficulty: {difficulty}
         
         QUALITY STANDARDS (CRITICAL):
         ✓ Statements must be PRECISE and UNAMBIGUOUS
@@ -143,7 +138,7 @@ async def generate_topic(req: TopicQuizRequest, request: Request):
         [
             {{
                 "type": "truefalse",
-                "prompt": "Precise, factual statement in {req.language}...",
+                "prompt": "Precise, factual statement in {language}...",
                 "choices": ["True", "False"],
                 "answer": "True",
                 "explanation": "Clear explanation with supporting facts and reasoning..."
@@ -152,79 +147,364 @@ async def generate_topic(req: TopicQuizRequest, request: Request):
         """
     
     else:  # mixed mode
-        # Calculate distribution for mixed mode
-        num_single = max(1, int(req.num_questions * 0.4))
-        num_multi = max(1, int(req.num_questions * 0.4))
-        num_tf = max(1, req.num_questions - num_single - num_multi)
+        # Calculate distribution for mixed mode (or use the caller's split,
+        # e.g. only the types a partly banked quiz still lacks)
+        if split is None:
+            split = type_distribution(mode, num_questions)
+        type_rules = {
+            "single": """- Set "type": "single"
+           - Provide exactly 4 choices
+           - Use "answer": "exact option text" (string, NOT array)
+           - DO NOT include "correct_answers" field""",
+            "multi": """- Set "type": "multi"
+           - Provide 4-6 choices
+           - Use "correct_answers": ["option1", "option2"] (array with 2+ items)
+           - DO NOT include "answer" field""",
+            "truefalse": """- Set "type": "truefalse"
+           - Provide EXACTLY 2 choices: ["True", "False"]
+           - Use "answer": "True" or "answer": "False" (string)
+           - DO NOT include "correct_answers" field""",
+        }
+        descriptions = {"single": "one correct answer", "multi": "2+ correct answers", "truefalse": "True/False only"}
+        examples = {
+            "single": f"""{{
+                "type": "single",
+                "prompt": "Question in {language}...",
+                "choices": ["A", "B", "C", "D"],
+                "answer": "A",
+                "explanation": "..."
+            }}""",
+            "multi": f"""{{
+                "type": "multi",
+                "prompt": "Question in {language}...",
+                "choices": ["A", "B", "C", "D"],
+                "correct_answers": ["A", "C"],
+                "explanation": "..."
+            }}""",
+            "truefalse": f"""{{
+                "type": "truefalse",
+                "prompt": "Statement in {language}...",
+                "choices": ["True", "False"],
+                "answer": "True",
+                "explanation": "..."
+            }}""",
+        }
+        types = [t for t in ("single", "multi", "truefalse") if split.get(t)]
+        num_questions = sum(split[t] for t in types)
+        counts = "\n        ".join(f'- Generate EXACTLY {split[t]} "{t}" type questions ({descriptions[t]})' for t in types)
+        total = " + ".join(str(split[t]) for t in types)
+        rules = "\n           \n".join(f'           For "{t}" type ({split[t]} questions):\n           {type_rules[t]}' for t in types)
+        example = ",\n            ".join(examples[t] for t in types)
+        reminder = " + ".join(f"{split[t]} {t}" for t in types)
         
         prompt = f"""
-        Generate EXACTLY {req.num_questions} questions in MIXED mode about "{req.topic}" in {req.language}.
-        Difficulty: {req.difficulty}
+        Generate EXACTLY {num_questions} questions in MIXED mode about "{topic}" in {language}.
+        Difficulty: {difficulty}
         
         CRITICAL DISTRIBUTION REQUIREMENT - YOU MUST FOLLOW THIS EXACTLY:
-        - Generate EXACTLY {num_single} "single" type questions (one correct answer)
-        - Generate EXACTLY {num_multi} "multi" type questions (2+ correct answers)
-        - Generate EXACTLY {num_tf} "truefalse" type questions (True/False only)
+        {counts}
         
-        TOTAL: {num_single} + {num_multi} + {num_tf} = {req.num_questions} questions
+        TOTAL: {total} = {num_questions} questions
         
         CRITICAL RULES - DO NOT BREAK:
-        1. You MUST generate ALL THREE types of questions in the exact quantities specified above
+        1. You MUST generate EVERY type listed above in the exact quantities specified
         2. DO NOT generate all questions as the same type
         3. MUST set "type" field correctly for EACH question
         4. Each question MUST follow its type's rules exactly:
            
-           For "single" type ({num_single} questions):
-           - Set "type": "single"
-           - Provide exactly 4 choices
-           - Use "answer": "exact option text" (string, NOT array)
-           - DO NOT include "correct_answers" field
-           
-           For "multi" type ({num_multi} questions):
-           - Set "type": "multi"
-           - Provide 4-6 choices
-           - Use "correct_answers": ["option1", "option2"] (array with 2+ items)
-           - DO NOT include "answer" field
-           
-           For "truefalse" type ({num_tf} questions):
-           - Set "type": "truefalse"
-           - Provide EXACTLY 2 choices: ["True", "False"]
-           - Use "answer": "True" or "answer": "False" (string)
-           - DO NOT include "correct_answers" field
+{rules}
         
+        Return ONLY a valid JSON array with the types mixed:
+        [
+            {example}
+        ]
+        
+        REMINDER: Generate {reminder} = {num_questions} total questions
+        """
+    
+    return prompt
+
+
+def _build_file_prompt(text_excerpt: str, num_questions: int, difficulty: str, language: str, mode: str) -> str:
+    # Generate strict mode-specific prompts (same quality as topic generation)
+    if mode == "single_only":
+        prompt = f"""
+        Based on the following text, generate {num_questions} HIGH-QUALITY SINGLE-CHOICE questions in {language}.
+        Difficulty: {difficulty}
+
+        QUALITY STANDARDS (CRITICAL):
+        ✓ Questions MUST be based on the TEXT CONTENT provided
+        ✓ Test UNDERSTANDING of the material, not just memorization
+        ✓ Use CLEAR, PROFESSIONAL wording
+        ✓ All wrong options must be PLAUSIBLE but clearly incorrect
+        ✓ Questions should cover KEY CONCEPTS from the text
+
+        TECHNICAL RULES:
+        1. Each question MUST have EXACTLY ONE correct answer
+        2. Set "type": "single" for ALL questions
+        3. Provide exactly 4 well-crafted options per question
+        4. Use "answer": "exact option text" (string, NOT array)
+        5. DO NOT include "correct_answers" field
+
+        EXPLANATION REQUIREMENTS:
+        - Explain WHY the answer is correct based on the text
+        - Reference specific information from the material
+        - Help students understand the concept
+
+        Text: {text_excerpt}
+
+        Return ONLY a valid JSON array:
+        [
+            {{
+                "type": "single",
+                "prompt": "Question text...",
+                "choices": ["Option A", "Option B", "Option C", "Option D"],
+                "answer": "Option A",
+                "explanation": "Explanation..."
+            }}
+        ]
+        """
+
+    elif mode == "multi_only":
+        prompt = f"""
+        Based on the following text, generate {num_questions} HIGH-QUALITY MULTIPLE-CHOICE questions in {language}.
+        Difficulty: {difficulty}
+
+        QUALITY STANDARDS (CRITICAL):
+        ✓ Questions must be based on the TEXT CONTENT provided
+        ✓ Test DEEP UNDERSTANDING of the material
+        ✓ Multiple correct answers should be LOGICALLY RELATED
+        ✓ Wrong options must be plausible but clearly incorrect
+
+        TECHNICAL RULES:
+        1. Each question MUST have TWO OR MORE correct answers (typically 2-3)
+        2. Set "type": "multi" for ALL questions
+        3. Provide 4-6 well-crafted options per question
+        4. Use "correct_answers": ["option1", "option2"] (array with 2+ items)
+        5. DO NOT include "answer" field
+
+        EXPLANATION REQUIREMENTS:
+        - Explain WHY each correct answer is right based on the text
+        - Reference specific details from the material
+        - Help students understand the full concept
+
+        Text: {text_excerpt}
+
+        Return ONLY a valid JSON array:
+        [
+            {{
+                "type": "multi",
+                "prompt": "Question text...",
+                "choices": ["Option A", "Option B", "Option C", "Option D"],
+                "correct_answers": ["Option A", "Option C"],
+                "explanation": "Explanation..."
+            }}
+        ]
+        """
+
+    elif mode == "truefalse_only":
+        prompt = f"""
+        Based on the following text, generate {num_questions} HIGH-QUALITY TRUE/FALSE questions in {language}.
+        Difficulty: {difficulty}
+
+        QUALITY STANDARDS (CRITICAL):
+        ✓ Statements must be derived directly from the TEXT CONTENT
+        ✓ Test FACTUAL ACCURACY and COMPREHENSION
+        ✓ Avoid ambiguous or opinion-based statements
+        ✓ Use specific facts from the text
+
+        TECHNICAL RULES:
+        1. Each question MUST have EXACTLY TWO options: "True" and "False"
+        2. Set "type": "truefalse" for ALL questions
+        3. Use "answer": "True" or "answer": "False" (string)
+        4. DO NOT include "correct_answers" field
+
+        EXPLANATION REQUIREMENTS:
+        - Explain WHY the statement is true or false based on the text
+        - Cite the specific part of the text that supports the answer
+        - Clarify the correct fact if the statement is false
+
+        Text: {text_excerpt}
+
+        Return ONLY a valid JSON array:
+        [
+            {{
+                "type": "truefalse",
+                "prompt": "Statement text...",
+                "choices": ["True", "False"],
+                "answer": "True",
+                "explanation": "Explanation..."
+            }}
+        ]
+        """
+
+    else:  # mixed mode
+        split = type_distribution(mode, num_questions)
+        num_single, num_multi, num_tf = split["single"], split["multi"], split["truefalse"]
+
+        prompt = f"""
+        Based on the following text, generate EXACTLY {num_questions} HIGH-QUALITY questions in MIXED mode in {language}.
+        Difficulty: {difficulty}
+
+        QUALITY STANDARDS (CRITICAL):
+        ✓ Questions must be based on the TEXT CONTENT provided
+        ✓ Test DEEP UNDERSTANDING of the material
+        ✓ Use CLEAR, PROFESSIONAL wording
+
+        CRITICAL DISTRIBUTION REQUIREMENT:
+        - Generate EXACTLY {num_single} "single" type questions (High Quality)
+        - Generate EXACTLY {num_multi} "multi" type questions (High Quality)
+        - Generate EXACTLY {num_tf} "truefalse" type questions (High Quality)
+
+        TOTAL: {num_single} + {num_multi} + {num_tf} = {num_questions} questions
+
+        EXPLANATION REQUIREMENTS:
+        - Explain WHY each answer is correct based on the text
+        - Reference specific details from the material
+        - Help students understand the full concept
+
+        Text: {text_excerpt}
+
         Return ONLY a valid JSON array with ALL THREE types mixed:
         [
             {{
                 "type": "single",
-                "prompt": "Question in {req.language}...",
+                "prompt": "Question...",
                 "choices": ["A", "B", "C", "D"],
                 "answer": "A",
                 "explanation": "..."
             }},
             {{
                 "type": "multi",
-                "prompt": "Question in {req.language}...",
+                "prompt": "Question...",
                 "choices": ["A", "B", "C", "D"],
                 "correct_answers": ["A", "C"],
                 "explanation": "..."
             }},
             {{
                 "type": "truefalse",
-                "prompt": "Statement in {req.language}...",
+                "prompt": "Statement...",
                 "choices": ["True", "False"],
                 "answer": "True",
                 "explanation": "..."
             }}
         ]
-        
-        REMINDER: Generate {num_single} single + {num_multi} multi + {num_tf} truefalse = {req.num_questions} total questions
         """
     
+    return prompt
+
+
+async def _extract_upload_text(file: UploadFile) -> str:
+    """Extract an upload's text and reject files with too little of it."""
+    try:
+        upload = await upload_service.ingest(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     try:
-        questions = await ai_service.generate_quiz(prompt)
+        text = await file_service.extract_for_prompt(upload)
+    except ValueError as e:
+         # Print error for debugging
+         print(f"❌ TEXT EXTRACTION ERROR: {e}")
+         raise HTTPException(status_code=400, detail=f"Error: {e}")
+    finally:
+        upload.remove()
+    
+    # DEBUG LOGGING - See what is actually extracted
+    print(f"📄 EXTRACTED TEXT SAMPLE (Len: {len(text)}):\n{text[:500]}...")
+    
+    # VALIDATE TEXT CONTENT - Increased to 300 chars to ensure minimal context
+    if len(text.strip()) < 300:
+        print(f"⚠️ REJECTED: Text too short ({len(text.strip())} chars)")
+        detailed_msg = f"File contains insufficient text ({len(text.strip())} characters). Extracted: {text[:100]}..."
+        raise HTTPException(status_code=400, detail=f"File content is to short or unreadable. It might be scanned/image-based. Please use a text-based PDF/DOCX.\n\nDebug: {detailed_msg}")
+    
+    return text
+
+
+def _document_sections(text: str, parts: int, query: str, budget_tokens: int) -> List[str]:
+    """Split a document into `parts` consecutive sections, each reduced to its most salient chunks."""
+    step = max(1, len(text) // max(1, parts))
+    sections = []
+    start = 0
+    for i in range(parts):
+        end = len(text) if i == parts - 1 else start + step
+        if i < parts - 1:
+            # End on a paragraph or line boundary when one is close by
+            boundary = text.find("\n", end, end + 500)
+            if boundary != -1:
+                end = boundary + 1
+        sections.append(select_context(text[start:end], query, budget_tokens))
+        start = end
+    return sections
+
+
+def _ndjson_line(question: dict) -> str:
+    return json.dumps(question, ensure_ascii=False) + "\n"
+
+
+@router.get("/health")
+async def health():
+    return {
+        "status": "healthy",
+        "ai_status": ai_service.status,
+        "provider": ai_service.provider,
+        "cache": ai_service.get_cache_stats(),
+        "question_bank": question_bank.stats(),
+        "hedging": ai_service.get_hedge_stats(),
+        "gemini_executor": ai_service.get_executor_stats(),
+        "rate_limits": ai_service.get_rate_limit_stats(),
+        "batching": ai_service.get_batch_stats(),
+        "uploads": upload_service.stats(),
+        "extraction": file_service.stats(),
+        "jobs": await job_queue.stats(),
+        "rendering": render_service.stats(),
+        "artifacts": artifact_cache.stats(),
+        "models": ai_service.get_model_info(),
+        "startup": startup_timer.snapshot()
+    }
+
+@router.post("/generate_topic")
+@limiter.limit("5/minute")
+async def generate_topic(req: TopicQuizRequest, request: Request):
+    if not ai_service.has_ai:
+        raise HTTPException(status_code=400, detail="AI not configured")
+    
+    mode = MODE_MAPPING.get(req.question_type, "single_only")
+    
+    # Serve what we can from the question bank; only the shortfall goes to the AI
+    bank_questions = await question_bank.sample(req.topic, req.language, req.difficulty, mode, req.num_questions)
+    needed = req.num_questions - len(bank_questions)
+    if needed <= 0:
+        return {"questions": bank_questions[:req.num_questions]}
+    
+    # Ask only for the types the banked questions are missing
+    prompt_mode, split = shortfall_split(mode, req.num_questions, bank_questions)
+    prompt = _build_topic_prompt(req.topic, needed, req.difficulty, req.language, prompt_mode, split)
+    
+    # The question bank is the cache for topic quizzes, so the response
+    # cache is bypassed (a cached answer could repeat banked questions).
+    # The key still lets identical concurrent requests share one call.
+    cache_key = ai_service.make_cache_key(
+        "generate_topic",
+        topic=req.topic,
+        difficulty=req.difficulty,
+        language=req.language,
+        mode=prompt_mode,
+        count=needed,
+        split=json.dumps(split, sort_keys=True)
+    )
+    
+    try:
+        # No offline fallback here: offline questions must not enter the bank
+        questions = await ai_service.generate_topic_quiz(
+            req.topic, needed, req.difficulty, req.language, prompt_mode, prompt, cache_key,
+            use_cache=False, split=split
+        )
         
-        # Validate and enforce question types
-        questions = ai_service.validate_question_types(questions, mode)
+        # Validate and enforce question types (in mixed mode, the split asked for)
+        questions = ai_service.enforce_type_distribution(questions, prompt_mode, needed, split)
+        await question_bank.add(questions, req.topic, req.language, req.difficulty)
+        questions = merge_questions(bank_questions, questions)
         
         # CRITICAL: Ensure we have the requested number of questions
         if len(questions) < req.num_questions:
@@ -241,9 +521,60 @@ async def generate_topic(req: TopicQuizRequest, request: Request):
         return {"questions": questions}
     except Exception as e:
         print(f"Error in generate_topic: {e}") # Debug log
-        # Fallback to offline quiz
-        offline_questions = ai_service.generate_offline_quiz(req.topic, req.num_questions, req.difficulty, mode)
-        return {"questions": offline_questions}
+        # Fallback to offline quiz for whatever the bank could not cover
+        offline_questions = ai_service.generate_offline_quiz(req.topic, needed, req.difficulty, mode)
+        return {"questions": bank_questions + offline_questions}
+
+@router.post("/generate_topic/stream")
+@limiter.limit("5/minute")
+async def generate_topic_stream(req: TopicQuizRequest, request: Request):
+    """Same quiz as /generate_topic, sent as NDJSON: one question per line as soon as it is ready."""
+    if not ai_service.has_ai:
+        raise HTTPException(status_code=400, detail="AI not configured")
+    
+    mode = MODE_MAPPING.get(req.question_type, "single_only")
+    bank_questions = await question_bank.sample(req.topic, req.language, req.difficulty, mode, req.num_questions)
+    needed = req.num_questions - len(bank_questions)
+    
+    async def lines():
+        questions = bank_questions[:req.num_questions]
+        for q in questions:
+            yield _ndjson_line(q)
+        if needed <= 0:
+            return
+        
+        prompt_mode, split = shortfall_split(mode, req.num_questions, bank_questions)
+        prompt = _build_topic_prompt(req.topic, needed, req.difficulty, req.language, prompt_mode, split)
+        cache_key = ai_service.make_cache_key(
+            "generate_topic",
+            topic=req.topic,
+            difficulty=req.difficulty,
+            language=req.language,
+            mode=prompt_mode,
+            count=needed,
+            split=json.dumps(split, sort_keys=True)
+        )
+        generated = []
+        try:
+            async for q in ai_service.generate_quiz_stream(prompt, prompt_mode, needed, cache_key=cache_key,
+                                                           use_cache=False, split=split):
+                if len(merge_questions(questions, [q])) == len(questions):
+                    continue  # duplicate of a banked question
+                questions.append(q)
+                generated.append(q)
+                yield _ndjson_line(q)
+        except Exception as e:
+            print(f"Error in generate_topic stream: {e}")
+        
+        await question_bank.add(generated, req.topic, req.language, req.difficulty)
+        
+        if len(questions) < req.num_questions:
+            print(f"⚠️ AI streamed only {len(questions)} questions, requested {req.num_questions}. Padding...")
+            padding = ai_service.generate_offline_quiz(req.topic, req.num_questions - len(questions), req.difficulty, mode)
+            for q in padding:
+                yield _ndjson_line(q)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 @router.post("/generate_file")
 @limiter.limit("3/minute")
@@ -261,211 +592,21 @@ async def generate_file(
     # Limit question count
     num_questions = min(max(num_questions, 1), 20)
     
-    filepath = os.path.join(UPLOAD_DIR, file.filename)
-    with open(filepath, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    text = await _extract_upload_text(file)
     
     try:
-        # Extract text from file
-        text = await file_service.extract_text(filepath)
-        if text.startswith("Error"):
-             # Print error for debugging
-             print(f"❌ TEXT EXTRACTION ERROR: {text}")
-             raise HTTPException(status_code=400, detail=text)
-        
-        # DEBUG LOGGING - See what is actually extracted
-        print(f"📄 EXTRACTED TEXT SAMPLE (Len: {len(text)}):\n{text[:500]}...")
-        
-        # VALIDATE TEXT CONTENT - Increased to 300 chars to ensure minimal context
-        if len(text.strip()) < 300:
-            print(f"⚠️ REJECTED: Text too short ({len(text.strip())} chars)")
-            detailed_msg = f"File contains insufficient text ({len(text.strip())} characters). Extracted: {text[:100]}..."
-            raise HTTPException(status_code=400, detail=f"File content is to short or unreadable. It might be scanned/image-based. Please use a text-based PDF/DOCX.\n\nDebug: {detailed_msg}")
-            
-        # Limit text length for processing
-        text_excerpt = text[:8000]  # Increased from 5000 for better context
-        
-        # Map user-facing question types to strict modes
-        MODE_MAPPING = {
-            "Single Choice": "single_only",
-            "Multiple Choice": "multi_only",
-            "True/False": "truefalse_only",
-            "Mixed": "mixed"
-        }
-        
         mode = MODE_MAPPING.get(question_type, "single_only")
         
-        # Generate strict mode-specific prompts (same quality as topic generation)
-        if mode == "single_only":
-            prompt = f"""
-            Based on the following text, generate {num_questions} HIGH-QUALITY SINGLE-CHOICE questions in {language}.
-            Difficulty: {difficulty}
-            
-            QUALITY STANDARDS (CRITICAL):
-            ✓ Questions MUST be based on the TEXT CONTENT provided
-            ✓ Test UNDERSTANDING of the material, not just memorization
-            ✓ Use CLEAR, PROFESSIONAL wording
-            ✓ All wrong options must be PLAUSIBLE but clearly incorrect
-            ✓ Questions should cover KEY CONCEPTS from the text
-            
-            TECHNICAL RULES:
-            1. Each question MUST have EXACTLY ONE correct answer
-            2. Set "type": "single" for ALL questions
-            3. Provide exactly 4 well-crafted options per question
-            4. Use "answer": "exact option text" (string, NOT array)
-            5. DO NOT include "correct_answers" field
-            
-            EXPLANATION REQUIREMENTS:
-            - Explain WHY the answer is correct based on the text
-            - Reference specific information from the material
-            - Help students understand the concept
-            
-            Text: {text_excerpt}
-            
-            Return ONLY a valid JSON array:
-            [
-                {{
-                    "type": "single",
-                    "prompt": "Question text...",
-                    "choices": ["Option A", "Option B", "Option C", "Option D"],
-                    "answer": "Option A",
-                    "explanation": "Explanation..."
-                }}
-            ]
-            """
-        
-        elif mode == "multi_only":
-            prompt = f"""
-            Based on the following text, generate {num_questions} HIGH-QUALITY MULTIPLE-CHOICE questions in {language}.
-            Difficulty: {difficulty}
-            
-            QUALITY STANDARDS (CRITICAL):
-            ✓ Questions must be based on the TEXT CONTENT provided
-            ✓ Test DEEP UNDERSTANDING of the material
-            ✓ Multiple correct answers should be LOGICALLY RELATED
-            ✓ Wrong options must be plausible but clearly incorrect
-            
-            TECHNICAL RULES:
-            1. Each question MUST have TWO OR MORE correct answers (typically 2-3)
-            2. Set "type": "multi" for ALL questions
-            3. Provide 4-6 well-crafted options per question
-            4. Use "correct_answers": ["option1", "option2"] (array with 2+ items)
-            5. DO NOT include "answer" field
-            
-            EXPLANATION REQUIREMENTS:
-            - Explain WHY each correct answer is right based on the text
-            - Reference specific details from the material
-            - Help students understand the full concept
-            
-            Text: {text_excerpt}
-            
-            Return ONLY a valid JSON array:
-            [
-                {{
-                    "type": "multi",
-                    "prompt": "Question text...",
-                    "choices": ["Option A", "Option B", "Option C", "Option D"],
-                    "correct_answers": ["Option A", "Option C"],
-                    "explanation": "Explanation..."
-                }}
-            ]
-            """
-        
-        elif mode == "truefalse_only":
-            prompt = f"""
-            Based on the following text, generate {num_questions} HIGH-QUALITY TRUE/FALSE questions in {language}.
-            Difficulty: {difficulty}
-            
-            QUALITY STANDARDS (CRITICAL):
-            ✓ Statements must be derived directly from the TEXT CONTENT
-            ✓ Test FACTUAL ACCURACY and COMPREHENSION
-            ✓ Avoid ambiguous or opinion-based statements
-            ✓ Use specific facts from the text
-            
-            TECHNICAL RULES:
-            1. Each question MUST have EXACTLY TWO options: "True" and "False"
-            2. Set "type": "truefalse" for ALL questions
-            3. Use "answer": "True" or "answer": "False" (string)
-            4. DO NOT include "correct_answers" field
-            
-            EXPLANATION REQUIREMENTS:
-            - Explain WHY the statement is true or false based on the text
-            - Cite the specific part of the text that supports the answer
-            - Clarify the correct fact if the statement is false
-            
-            Text: {text_excerpt}
-            
-            Return ONLY a valid JSON array:
-            [
-                {{
-                    "type": "truefalse",
-                    "prompt": "Statement text...",
-                    "choices": ["True", "False"],
-                    "answer": "True",
-                    "explanation": "Explanation..."
-                }}
-            ]
-            """
-        
-        else:  # mixed mode
-            num_single = max(1, int(num_questions * 0.4))
-            num_multi = max(1, int(num_questions * 0.4))
-            num_tf = max(1, num_questions - num_single - num_multi)
-            
-            prompt = f"""
-            Based on the following text, generate EXACTLY {num_questions} HIGH-QUALITY questions in MIXED mode in {language}.
-            Difficulty: {difficulty}
-            
-            QUALITY STANDARDS (CRITICAL):
-            ✓ Questions must be based on the TEXT CONTENT provided
-            ✓ Test DEEP UNDERSTANDING of the material
-            ✓ Use CLEAR, PROFESSIONAL wording
-            
-            CRITICAL DISTRIBUTION REQUIREMENT:
-            - Generate EXACTLY {num_single} "single" type questions (High Quality)
-            - Generate EXACTLY {num_multi} "multi" type questions (High Quality)
-            - Generate EXACTLY {num_tf} "truefalse" type questions (High Quality)
-            
-            TOTAL: {num_single} + {num_multi} + {num_tf} = {num_questions} questions
-            
-            EXPLANATION REQUIREMENTS:
-            - Explain WHY each answer is correct based on the text
-            - Reference specific details from the material
-            - Help students understand the full concept
-            
-            Text: {text_excerpt}
-            
-            Return ONLY a valid JSON array with ALL THREE types mixed:
-            [
-                {{
-                    "type": "single",
-                    "prompt": "Question...",
-                    "choices": ["A", "B", "C", "D"],
-                    "answer": "A",
-                    "explanation": "..."
-                }},
-                {{
-                    "type": "multi",
-                    "prompt": "Question...",
-                    "choices": ["A", "B", "C", "D"],
-                    "correct_answers": ["A", "C"],
-                    "explanation": "..."
-                }},
-                {{
-                    "type": "truefalse",
-                    "prompt": "Statement...",
-                    "choices": ["True", "False"],
-                    "answer": "True",
-                    "explanation": "..."
-                }}
-            ]
-            """
-        
-        # Generate quiz with NO FALLBACK (we want error if AI fails, not generic questions)
-        questions = await ai_service.generate_quiz(prompt, allow_fallback=False)
-        
-        # Validate and enforce question types
-        questions = ai_service.validate_question_types(questions, mode)
+        # Large quizzes run as parallel shards, each on its own section of the document
+        shard_counts = ai_service.plan_shards(num_questions)
+        sections = _document_sections(text, len(shard_counts), filename_query(file.filename), ai_service.context_budget())
+        
+        # Generate quiz with NO FALLBACK (we want error if AI fails, not generic questions).
+        # Shard results come back validated, de-duplicated and type-balanced.
+        questions = await ai_service.generate_quiz_sharded(
+            shard_counts, mode,
+            lambda i, count: _build_file_prompt(sections[i], count, difficulty, language, mode)
+        )
         
         # Ensure correct number of questions
         if len(questions) < num_questions:
@@ -496,9 +637,52 @@ async def generate_file(
             detail = f"Processing Error: {error_msg}"
             
         raise HTTPException(status_code=500, detail=detail)
-    finally:
-        if os.path.exists(filepath):
-            os.remove(filepath)
+@router.post("/generate_file/stream")
+@limiter.limit("3/minute")
+async def generate_file_stream(
+    request: Request,
+    file: UploadFile = File(...),
+    difficulty: str = Form("Medium"),
+    num_questions: int = Form(5),
+    question_type: str = Form("Single Choice"),
+    language: str = Form("English")
+):
+    """Same quiz as /generate_file, sent as NDJSON: one question per line as soon as it is ready.
+    
+    Extraction errors are still reported as normal HTTP errors. If
+    generation fails before any question was sent, the stream is a single
+    {"error": ...} line; if it fails or falls short after that, the
+    remaining questions are padded with offline ones, as /generate_file does.
+    """
+    if not ai_service.has_ai:
+        raise HTTPException(status_code=400, detail="AI not configured")
+    
+    num_questions = min(max(num_questions, 1), 20)
+    text = await _extract_upload_text(file)
+    mode = MODE_MAPPING.get(question_type, "single_only")
+    context = select_context(text, filename_query(file.filename), ai_service.context_budget())
+    prompt = _build_file_prompt(context, num_questions, difficulty, language, mode)
+    filename = file.filename
+    
+    async def lines():
+        sent = 0
+        try:
+            async for q in ai_service.generate_quiz_stream(prompt, mode, num_questions):
+                sent += 1
+                yield _ndjson_line(q)
+        except Exception as e:
+            print(f"❌ GENERATION ERROR: {e}")
+            if sent == 0:
+                yield _ndjson_line({"error": f"Could not generate questions from this text: {e}"})
+                return
+        
+        if sent < num_questions:
+            print(f"⚠️ AI streamed only {sent} questions from file, requested {num_questions}. Padding...")
+            padding = ai_service.generate_offline_quiz(f"Content from {filename}", num_questions - sent, difficulty, mode)
+            for q in padding:
+                yield _ndjson_line(q)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 @router.post("/teacher_help")
 @limiter.limit("5/minute")
@@ -1,4 +1,7 @@
+from utils.startup_timer import startup_timer
+
 import os
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,6 +14,11 @@ from api.routes import router as api_router
 from api import auth
 from utils.helpers import get_random_quote
 from services.ai_service import ai_service
+from services.question_bank import question_bank
+from services.file_service import file_service
+from services.job_queue import job_queue
+from services.render_service import render_service
+from services.artifact_cache import artifact_cache
 from utils.limiter import limiter
 from fastapi.responses import FileResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
@@ -29,12 +37,30 @@ async def startup_event():
     print("\n" + "="*50)
     print("✅ SERVER RESTARTED SUCCESSFULLY! - Version With Fixes")
     print("="*50 + "\n")
+    # Clear cache entries left behind by older prompt template versions
+    asyncio.create_task(ai_service.retire_stale_cache_versions())
+    # Refresh the Gemini model list without holding up the first request
+    asyncio.create_task(discover_models())
+    # Background workers for library uploads and presentation rendering
+    await job_queue.start()
+    startup_timer.mark("app_ready")
+    startup_timer.report()
+
+async def discover_models():
+    if await ai_service.discover_gemini_models():
+        startup_timer.mark("models_discovered")
+        startup_timer.report()
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up resources on shutdown."""
     await ai_service.close()
+    await question_bank.close()
+    await file_service.close()
+    await job_queue.close()
+    await render_service.close()
+    await artifact_cache.close()
 
 @app.get("/manifest.json")
 async def manifest():
@@ -83,8 +109,11 @@ from api import library
 app.include_router(library.router)
 from api import presentation
 app.include_router(presentation.router)
+from api import jobs
+app.include_router(jobs.router)
 app.include_router(auth.router)
 app.include_router(api_router)
+startup_timer.mark("imports")
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,32 +1,112 @@
 import os
 import json
 import asyncio
+import math
 import aiohttp
-import google.generativeai as genai
 import ast
+import copy
 import re
 import hashlib
-import sqlite3
 import time
-from typing import List, Dict, Any, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Tuple
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from utils.singleflight import SingleFlight
+from utils.microbatch import MicroBatcher
+from services.rate_limiter import ProviderRateLimited, ProviderRateLimiter, backoff_delay, parse_retry_after, parse_retry_hint
+from services.provider_health import CircuitBreaker
+from services.question_bank import MODE_TYPES, remove_near_duplicates, type_distribution
+from utils.json_stream import JSONArrayStreamParser
+from services.cache_service import CacheBackend, MemoryLRUCache, SQLiteCacheBackend, TieredCache
+
 # Ensure .env is loaded even when the working directory differs.
 _project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 load_dotenv(os.path.join(_project_root, ".env"))
 
+_genai_module = None
+
+
+def _genai():
+    """Import the Gemini SDK on first use.
+    
+    It is the slowest import in the app and is never needed when no
+    GEMINI_API_KEY is configured.
+    """
+    global _genai_module
+    if _genai_module is None:
+        import google.generativeai
+        _genai_module = google.generativeai
+    return _genai_module
+
+
 class AIService:
     # Configuration constants
-    MAX_CACHE_ENTRIES = 1000
+    MAX_CACHE_BYTES = 64 * 1024 * 1024  # 64 MB of cached payloads on disk
     MAX_CACHED_PROMPT_LENGTH = 1000
+    L1_CACHE_ENTRIES = 512
+    L1_CACHE_BYTES = 16 * 1024 * 1024  # 16 MB
+    L1_CACHE_TTL = 3600  # seconds
     PROVIDER_TIMEOUT = 10  # seconds
     CONNECTION_TIMEOUT = 5  # seconds
     FAILURE_THRESHOLD = 3
     COOLDOWN_DURATION = 30  # seconds
+    HALF_OPEN_PROBES = 1  # concurrent trial calls once a cooldown expires
     MAX_TOKEN_LENGTH = 2048
     MAX_CHAT_HISTORY = 8  # messages
     MAX_FILE_CONTENT = 15000  # characters
+    # Document context per prompt, sized to what each provider handles well
+    CONTEXT_TOKEN_BUDGETS = {"gemini": 3000, "cloudflare": 1500, "huggingface": 500}
+    CHAT_FALLBACK = ("I'm experiencing some technical difficulties, but I'm here to help! "
+                     "Could you rephrase your question? Meanwhile, try breaking down the problem into smaller parts.")
+    # Hedged requests: if the current provider hasn't answered within its
+    # HEDGE_PERCENTILE latency, fire the next healthy provider in parallel.
+    HEDGE_ENABLED = os.getenv("AI_HEDGE_REQUESTS", "").lower() in ("1", "true", "yes")
+    HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "0.9"))
+    HEDGE_DEFAULT_DELAY = float(os.getenv("AI_HEDGE_DELAY", "4"))  # seconds, until enough samples
+    HEDGE_MIN_DELAY = 0.5  # seconds
+    HEDGE_MIN_SAMPLES = 10
+    LATENCY_WINDOW = 100  # recent latencies kept per provider
+    SHARD_SIZE = 5  # questions per parallel sub-request for large quizzes
+    MAX_SHARDS = 4
+    DUPLICATE_SIMILARITY = 0.8  # word overlap at which two merged questions count as one
+    # Opt-in micro-batching: small concurrent topic quizzes share one provider call
+    BATCH_ENABLED = os.getenv("AI_BATCH_REQUESTS", "").lower() in ("1", "true", "yes")
+    BATCH_WINDOW = float(os.getenv("AI_BATCH_WINDOW", "0.05"))  # seconds to wait for batch mates
+    BATCH_MAX_SIZE = 6  # topics per combined prompt
+    BATCH_MAX_QUESTIONS = 10  # larger quizzes always get their own call
+    BATCH_FORMAT_RULES = {
+        "single": '"type": "single", exactly 4 "choices" and "answer" set to the exact text of the one correct option',
+        "multi": '"type": "multi", 4-6 "choices" and "correct_answers" listing the 2 or more correct options',
+        "truefalse": '"type": "truefalse", "choices": ["True", "False"] and "answer" set to "True" or "False"',
+    }
+    DEFAULT_GEMINI_MODELS = (
+        'models/gemini-1.5-flash',
+        'models/gemini-1.5-pro',
+        'models/gemini-1.0-pro',
+        'gemini-1.5-flash',
+        'gemini-pro'
+    )
+    MODEL_CACHE_FILE = "gemini_models.json"
+    MODEL_CACHE_TTL = int(os.getenv("GEMINI_MODEL_CACHE_TTL", str(24 * 3600)))  # seconds
+    MODEL_DISCOVERY_TIMEOUT = 15  # seconds
+    GEMINI_MAX_WORKERS = int(os.getenv("GEMINI_MAX_WORKERS", "8"))
+    # Per-provider quotas as (requests/min, tokens/min); defaults match free tiers
+    RATE_LIMITS = {
+        "gemini": (float(os.getenv("GEMINI_RPM", "15")), float(os.getenv("GEMINI_TPM", "1000000"))),
+        "cloudflare": (float(os.getenv("CLOUDFLARE_RPM", "300")), float(os.getenv("CLOUDFLARE_TPM", "200000"))),
+        "huggingface": (float(os.getenv("HUGGINGFACE_RPM", "30")), float(os.getenv("HUGGINGFACE_TPM", "100000"))),
+    }
+    RATE_LIMIT_MAX_WAIT = 2.0  # seconds to queue for quota before rerouting
+    MAX_RATE_LIMIT_RETRIES = 2
+    EXPECTED_OUTPUT_TOKENS = 1024  # added to the prompt estimate for TPM accounting
+    # Bump an endpoint's version whenever its prompt template changes output format
+    TEMPLATE_VERSIONS = {
+        "generate_topic": 1,
+        "quiz_generate": 1,
+    }
     
     def __init__(self):
         self.cloudflare_api_key = os.getenv("CLOUDFLARE_API_KEY", "")
@@ -38,8 +118,11 @@ class AIService:
         self.provider = "None"
         self.status = "Offline"
         self.model = None
+        self.current_model_name = ""
         self.fallback_models = []
         self.current_provider = ""
+        self._models_source = "none"
+        self._models_discovered_at: Optional[float] = None
         
         # Connection pooling for better performance
         self._session = None
@@ -47,36 +130,48 @@ class AIService:
             total=self.PROVIDER_TIMEOUT, 
             connect=self.CONNECTION_TIMEOUT
         )
+        # Streams may run longer than PROVIDER_TIMEOUT overall; only stalls are fatal
+        self._stream_timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=self.CONNECTION_TIMEOUT,
+            sock_read=self.PROVIDER_TIMEOUT
+        )
+        
+        # Dedicated pool for blocking Gemini SDK calls, kept off the default
+        # executor that FastAPI uses for sync endpoints
+        self._gemini_executor = ThreadPoolExecutor(max_workers=self.GEMINI_MAX_WORKERS, thread_name_prefix="gemini")
+        self._gemini_queued = 0
+        self._gemini_active = 0
         
         # Response cache
         self._cache_db = "ai_cache.db"
+        self._cache: CacheBackend = TieredCache(
+            SQLiteCacheBackend(self._cache_db, self.MAX_CACHE_BYTES),
+            MemoryLRUCache(self.L1_CACHE_ENTRIES, self.L1_CACHE_BYTES, self.L1_CACHE_TTL)
+        )
         self._init_cache()
         
-        # Provider health tracking
-        self._provider_failures = {}
-        self._provider_cooldown = {}
+        # Single-flight deduplication of identical in-flight prompts
+        self._inflight = SingleFlight()
+        
+        # Provider health tracking: circuit breakers also demote erroring or unusually slow providers
+        self._breakers = {
+            name: CircuitBreaker(name, self.FAILURE_THRESHOLD, self.COOLDOWN_DURATION, self.HALF_OPEN_PROBES)
+            for name in ("gemini", "cloudflare", "huggingface")
+        }
+        self._provider_latencies: Dict[str, deque] = {}
+        self._hedge_stats: Dict[str, Dict[str, int]] = {}
+        self._batcher = MicroBatcher(self._run_quiz_batch, self.BATCH_WINDOW, self.BATCH_MAX_SIZE)
+        self._rate_limiters = {
+            name: ProviderRateLimiter(name, rpm, tpm) for name, (rpm, tpm) in self.RATE_LIMITS.items()
+        }
         
         self._initialize_providers()
 
     def _init_cache(self):
-        """Initialize SQLite cache for AI responses."""
+        """Initialize the SQLite cache backend for AI responses."""
         try:
-            conn = sqlite3.connect(self._cache_db)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS ai_cache (
-                    prompt_hash TEXT PRIMARY KEY,
-                    prompt TEXT,
-                    response TEXT,
-                    provider TEXT,
-                    created_at TIMESTAMP,
-                    access_count INTEGER DEFAULT 1
-                )
-            ''')
-            # Create index for faster lookups (hybrid frequency/recency for cache eviction)
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_access_count ON ai_cache(access_count DESC, created_at DESC)')
-            conn.commit()
-            conn.close()
+            self._cache.init_sync()
         except Exception as e:
             print(f"Cache init error: {e}")
     
@@ -90,51 +185,24 @@ class AIService:
         # Initialize Gemini if key exists
         if self.gemini_api_key:
             try:
-                genai.configure(api_key=self.gemini_api_key)
-                print("Gemini Configured. Discovering available models...")
-                
-                # Dynamic Model Discovery
-                available_models = []
-                try:
-                    for m in genai.list_models():
-                        if 'generateContent' in m.supported_generation_methods:
-                            available_models.append(m.name)
-                except Exception as e:
-                    print(f"Model Discovery Failed (using defaults): {e}")
-
-                # Default Fallbacks if discovery fails
-                defaults = [
-                    'models/gemini-1.5-flash',
-                    'models/gemini-1.5-pro',
-                    'models/gemini-1.0-pro',
-                    'gemini-1.5-flash',
-                    'gemini-pro'
-                ]
+                _genai().configure(api_key=self.gemini_api_key)
                 
-                if available_models:
-                    print(f"Discovered Models: {available_models}")
-                    # Prioritize Flash > Pro > 1.0
-                    sorted_models = []
-                    # Add Flash variants first
-                    sorted_models.extend([m for m in available_models if 'flash' in m.lower() and '1.5' in m])
-                    # Add Pro variants
-                    sorted_models.extend([m for m in available_models if 'pro' in m.lower() and '1.5' in m])
-                    # Add 1.0/Legacy variants
-                    sorted_models.extend([m for m in available_models if '1.0' in m or 'gemini-pro' in m])
-                    # Add everything else
-                    remaining = [m for m in available_models if m not in sorted_models]
-                    sorted_models.extend(remaining)
-                    
-                    self.fallback_models = sorted_models
+                # Never block startup on list_models(): serve the persisted
+                # list (or the defaults) until discover_gemini_models() runs
+                cached_models, fresh = self._load_model_cache()
+                if cached_models:
+                    print(f"Gemini Configured. Using {'cached' if fresh else 'stale cached'} model list")
+                    self.fallback_models = cached_models
+                    self._models_source = "cache" if fresh else "stale_cache"
                 else:
-                    self.fallback_models = defaults
+                    print("Gemini Configured. Using default models until discovery finishes")
+                    self.fallback_models = list(self.DEFAULT_GEMINI_MODELS)
+                    self._models_source = "defaults"
 
                 # Select best model
                 if self.fallback_models:
                     model_name = self.fallback_models[0]
-                    self.model = genai.GenerativeModel(model_name)
-                    self.current_model_name = model_name
-                    self.provider = f"Gemini ({model_name})"
+                    self._select_gemini_model(model_name)
                     self.has_ai = True
                     self.status = "Online"
                     print(f"Gemini initialized with: {model_name}")
@@ -169,6 +237,93 @@ class AIService:
             self.status = "Offline Mode (Rule-based)"
             self.current_provider = "offline"
 
+    def _load_model_cache(self):
+        """Return (models, is_fresh) from the persisted discovery result."""
+        try:
+            with open(self.MODEL_CACHE_FILE, encoding="utf-8") as f:
+                data = json.load(f)
+            models = [m for m in data.get("models", []) if isinstance(m, str)]
+            fresh = time.time() - float(data.get("discovered_at", 0)) < self.MODEL_CACHE_TTL
+            if models:
+                self._models_discovered_at = float(data.get("discovered_at", 0))
+            return models, fresh
+        except (OSError, ValueError, TypeError):
+            return [], False
+    
+    def _save_model_cache(self, models: List[str]):
+        tmp_path = self.MODEL_CACHE_FILE + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"models": models, "discovered_at": time.time()}, f)
+            os.replace(tmp_path, self.MODEL_CACHE_FILE)
+        except OSError as e:
+            print(f"Could not persist Gemini model list: {e}")
+    
+    @staticmethod
+    def _rank_gemini_models(available_models: List[str]) -> List[str]:
+        # Prioritize Flash > Pro > 1.0
+        sorted_models = []
+        # Add Flash variants first
+        sorted_models.extend([m for m in available_models if 'flash' in m.lower() and '1.5' in m])
+        # Add Pro variants
+        sorted_models.extend([m for m in available_models if 'pro' in m.lower() and '1.5' in m and m not in sorted_models])
+        # Add 1.0/Legacy variants
+        sorted_models.extend([m for m in available_models if ('1.0' in m or 'gemini-pro' in m) and m not in sorted_models])
+        # Add everything else
+        remaining = [m for m in available_models if m not in sorted_models]
+        sorted_models.extend(remaining)
+        return sorted_models
+    
+    def _list_gemini_models_sync(self) -> List[str]:
+        return [m.name for m in _genai().list_models() if 'generateContent' in m.supported_generation_methods]
+    
+    async def discover_gemini_models(self, force: bool = False) -> bool:
+        """Refresh the Gemini model list in the background.
+        
+        Skipped while the persisted list is younger than MODEL_CACHE_TTL,
+        unless force is set. Requests keep using the current list meanwhile.
+        """
+        if not self.gemini_api_key or not self.model:
+            return False
+        if not force and self._models_source == "cache":
+            return False
+        
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            available_models = await asyncio.wait_for(
+                loop.run_in_executor(self._gemini_executor, self._list_gemini_models_sync),
+                timeout=self.MODEL_DISCOVERY_TIMEOUT
+            )
+        except Exception as e:
+            print(f"Model Discovery Failed (keeping {self._models_source} list): {e}")
+            return False
+        if not available_models:
+            return False
+        
+        print(f"Discovered Models in {time.perf_counter() - started:.2f}s: {available_models}")
+        ranked = self._rank_gemini_models(available_models)
+        self._save_model_cache(ranked)
+        self.fallback_models = ranked
+        self._models_source = "discovered"
+        self._models_discovered_at = time.time()
+        if self.current_model_name not in ranked:
+            self._select_gemini_model(ranked[0])
+        return True
+    
+    def _select_gemini_model(self, model_name: str):
+        self.model = _genai().GenerativeModel(model_name)
+        self.current_model_name = model_name
+        self.provider = f"Gemini ({model_name})"
+    
+    def get_model_info(self) -> Dict[str, Any]:
+        return {
+            "current": self.current_model_name,
+            "source": self._models_source,
+            "discovered_at": self._models_discovered_at,
+            "candidates": len(self.fallback_models),
+        }
+
     async def _get_session(self):
         """Get or create a persistent session for connection pooling."""
         if self._session is None or self._session.closed:
@@ -179,6 +334,7 @@ class AIService:
         """Close the session when shutting down."""
         if self._session is not None and not self._session.closed:
             await self._session.close()
+        await self._cache.close()
     
     def _get_cache_key(self, prompt: str) -> str:
         """Generate cache key from prompt."""
@@ -186,116 +342,143 @@ class AIService:
         compressed = ' '.join(prompt.split())
         return hashlib.md5(compressed.encode()).hexdigest()
     
-    def _get_from_cache(self, prompt: str) -> Optional[str]:
+    @staticmethod
+    def _normalize_key_field(value: Any) -> Any:
+        if isinstance(value, str):
+            return ' '.join(value.split()).casefold()
+        return value
+    
+    def make_cache_key(self, namespace: str, **fields: Any) -> str:
+        """Build a canonical cache key from normalized request fields.
+        
+        Keys look like ``<namespace>:v<template version>:<sha256>``, so the
+        same request maps to the same entry however the prompt text is
+        worded, and bumping TEMPLATE_VERSIONS[namespace] retires old entries.
+        """
+        version = self.TEMPLATE_VERSIONS.get(namespace, 1)
+        normalized = {k: self._normalize_key_field(v) for k, v in fields.items()}
+        digest = hashlib.sha256(json.dumps(normalized, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+        return f"{namespace}:v{version}:{digest}"
+    
+    async def retire_stale_cache_versions(self):
+        """Drop cache entries written under superseded template versions."""
+        for namespace, version in self.TEMPLATE_VERSIONS.items():
+            try:
+                removed = await self._cache.invalidate_prefix(f"{namespace}:", keep_prefix=f"{namespace}:v{version}:")
+                if removed:
+                    print(f"🧹 Retired {removed} stale '{namespace}' cache entries")
+            except Exception as e:
+                print(f"Cache retire error ({namespace}): {e}")
+    
+    def get_cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss counters for each cache tier."""
+        stats = self._cache.stats()
+        stats["single_flight"] = self._inflight.stats()
+        return stats
+    
+    async def _get_from_cache(self, prompt: str, cache_key: Optional[str] = None) -> Optional[str]:
         """Retrieve response from cache if available."""
         try:
-            cache_key = self._get_cache_key(prompt)
-            conn = sqlite3.connect(self._cache_db)
-            cursor = conn.cursor()
-            
-            # Get cached response
-            cursor.execute(
-                'SELECT response, provider FROM ai_cache WHERE prompt_hash = ?',
-                (cache_key,)
-            )
-            result = cursor.fetchone()
-            
+            result = await self._cache.get(cache_key or self._get_cache_key(prompt))
             if result:
-                # Update access count
-                cursor.execute(
-                    'UPDATE ai_cache SET access_count = access_count + 1 WHERE prompt_hash = ?',
-                    (cache_key,)
-                )
-                conn.commit()
-                conn.close()
                 print(f"✓ Cache hit for prompt (provider: {result[1]})")
                 return result[0]
-            
-            conn.close()
             return None
         except Exception as e:
             print(f"Cache read error: {e}")
             return None
     
-    def _save_to_cache(self, prompt: str, response: str, provider: str):
+    async def _save_to_cache(self, prompt: str, response: str, provider: str, cache_key: Optional[str] = None):
         """Save response to cache."""
         try:
-            cache_key = self._get_cache_key(prompt)
-            conn = sqlite3.connect(self._cache_db)
-            cursor = conn.cursor()
+            cache_key = cache_key or self._get_cache_key(prompt)
             
             # Limit prompt size in cache
             prompt_truncated = prompt[:self.MAX_CACHED_PROMPT_LENGTH] if len(prompt) > self.MAX_CACHED_PROMPT_LENGTH else prompt
-            
-            cursor.execute('''
-                INSERT OR REPLACE INTO ai_cache 
-                (prompt_hash, prompt, response, provider, created_at, access_count)
-                VALUES (?, ?, ?, ?, ?, 1)
-            ''', (cache_key, prompt_truncated, response, provider, datetime.now()))
-            
-            conn.commit()
-            conn.close()
-            
-            # Clean old cache entries (keep last 1000)
-            self._cleanup_cache()
+            # Write-behind: the backend batches writes and evicts by byte budget
+            await self._cache.set(cache_key, prompt_truncated, response, provider)
         except Exception as e:
             print(f"Cache write error: {e}")
     
-    def _cleanup_cache(self):
-        """Remove old cache entries using hybrid frequency/recency eviction strategy."""
-        try:
-            conn = sqlite3.connect(self._cache_db)
-            cursor = conn.cursor()
-            
-            # Keep the MAX_CACHE_ENTRIES most frequently/recently accessed entries
-            # Prioritizes frequently used entries (access_count), with recency as tiebreaker
-            cursor.execute(f'''
-                DELETE FROM ai_cache WHERE prompt_hash NOT IN (
-                    SELECT prompt_hash FROM ai_cache 
-                    ORDER BY access_count DESC, created_at DESC 
-                    LIMIT {self.MAX_CACHE_ENTRIES}
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"Cache cleanup error: {e}")
-    
-    def _is_provider_on_cooldown(self, provider: str) -> bool:
-        """Check if provider is on cooldown after failures."""
-        if provider not in self._provider_cooldown:
-            return False
-        
-        cooldown_until = self._provider_cooldown[provider]
-        if time.time() < cooldown_until:
-            return True
-        
-        # Cooldown expired, reset
-        del self._provider_cooldown[provider]
-        self._provider_failures[provider] = 0
-        return False
-    
-    def _mark_provider_failure(self, provider: str):
-        """Track provider failures and set cooldown if needed."""
-        self._provider_failures[provider] = self._provider_failures.get(provider, 0) + 1
-        
-        # After FAILURE_THRESHOLD failures, put on COOLDOWN_DURATION cooldown
-        if self._provider_failures[provider] >= self.FAILURE_THRESHOLD:
-            self._provider_cooldown[provider] = time.time() + self.COOLDOWN_DURATION
-            print(f"⚠️ {provider} on cooldown for {self.COOLDOWN_DURATION}s after {self._provider_failures[provider]} failures")
-    
-    def _mark_provider_success(self, provider: str):
-        """Reset failure count on successful call."""
-        if provider in self._provider_failures:
-            self._provider_failures[provider] = 0
+    def get_provider_health(self) -> Dict[str, Dict[str, Any]]:
+        """Circuit state and EWMA ranking score for each provider."""
+        return {name: breaker.snapshot() for name, breaker in self._breakers.items()}
 
-    async def generate_with_cloudflare(self, prompt: str) -> str:
+    def _cloudflare_endpoint(self):
         url = f"https://api.cloudflare.com/client/v4/accounts/{self.cloudflare_account_id}/ai/run/@cf/meta/llama-3.3-70b-instruct-fp8-fast"
         headers = {
             "Authorization": f"Bearer {self.cloudflare_api_key}",
             "Content-Type": "application/json"
         }
+        return url, headers
+
+    async def stream_with_cloudflare(self, prompt: str) -> AsyncIterator[str]:
+        """Stream tokens from Cloudflare Workers AI (server-sent events)."""
+        url, headers = self._cloudflare_endpoint()
+        payload = {
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 4096,
+            "stream": True
+        }
+        
+        session = await self._get_session()
+        async with session.post(url, headers=headers, json=payload, timeout=self._stream_timeout) as response:
+            if response.status in (429, 503):
+                text = await response.text()
+                retry_after = parse_retry_after(response.headers.get("Retry-After")) or parse_retry_hint(text)
+                raise ProviderRateLimited(f"Cloudflare API error: {response.status} - {text}", retry_after)
+            if response.status != 200:
+                text = await response.text()
+                raise Exception(f"Cloudflare API error: {response.status} - {text}")
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8', errors='ignore').strip()
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    continue
+                chunk = event.get('response') or ''
+                if chunk:
+                    yield chunk
+
+    async def stream_with_gemini(self, prompt: str) -> AsyncIterator[str]:
+        """Stream tokens from the current Gemini model.
+        
+        Like the Cloudflare stream's read timeout, only stalls are fatal:
+        the request and each following chunk must arrive within
+        PROVIDER_TIMEOUT seconds.
+        """
+        model = _genai().GenerativeModel(self.current_model_name)
+        generate_async = getattr(model, "generate_content_async", None)
+        if generate_async is None:
+            # SDK without async streaming: fall back to one chunk
+            yield await asyncio.wait_for(self.generate_with_gemini(prompt), timeout=self.PROVIDER_TIMEOUT)
+            return
+        try:
+            response = await asyncio.wait_for(generate_async(prompt, stream=True), timeout=self.PROVIDER_TIMEOUT)
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.PROVIDER_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                text = chunk.text
+                if text:
+                    yield text
+        except asyncio.TimeoutError:
+            print(f"⏱️ gemini stream stalled for {self.PROVIDER_TIMEOUT}s")
+            raise Exception("gemini timeout")
+        except Exception as e:
+            if type(e).__name__ == "ResourceExhausted" or "429" in str(e):
+                raise ProviderRateLimited(f"Gemini quota exceeded: {e}", parse_retry_hint(str(e)))
+            raise
+
+    async def generate_with_cloudflare(self, prompt: str) -> str:
+        url, headers = self._cloudflare_endpoint()
         payload = {
             "messages": [{"role": "user", "content": prompt}],
             "max_tokens": 4096
@@ -318,6 +501,10 @@ class AIService:
                             return str(val) if not isinstance(val, (str, bytes)) else val
                         return str(first)
                     raise Exception(f"Unexpected Cloudflare format: {result}")
+                elif response.status in (429, 503):
+                    text = await response.text()
+                    retry_after = parse_retry_after(response.headers.get("Retry-After")) or parse_retry_hint(text)
+                    raise ProviderRateLimited(f"Cloudflare API error: {response.status} - {text}", retry_after)
                 else:
                     text = await response.text()
                     raise Exception(f"Cloudflare API error: {response.status} - {text}")
@@ -354,30 +541,15 @@ class AIService:
     async def generate_with_fallback(self, prompt: str) -> str:
         """Try Gemini -> Cloudflare -> HuggingFace -> Mock."""
         
-        # 1. Try Gemini (Primary)
+        # 1. Try Gemini (primary model, then its fallbacks)
         if self.model:
             try:
-                print(f"Attempting Gemini with {self.current_model_name}")
                 response = await self.generate_with_gemini(prompt)
                 if response: return response
             except Exception as e:
-                print(f"Gemini Primary Failed: {e}")
-                
-        # 2. Try Gemini Fallbacks
-        if self.fallback_models:
-            for model_name in self.fallback_models:
-                try:
-                    print(f"Attempting Gemini Fallback: {model_name}")
-                    # Reconfigure
-                    genai.configure(api_key=self.gemini_api_key)
-                    self.model = genai.GenerativeModel(model_name)
-                    self.current_model_name = model_name # Update current model name
-                    response = await self.generate_with_gemini(prompt)
-                    if response: return response
-                except Exception as e:
-                    print(f"Gemini {model_name} Failed: {e}")
+                print(f"Gemini Failed: {e}")
 
-        # 3. Try Cloudflare (Secondary)
+        # 2. Try Cloudflare (Secondary)
         if self.cloudflare_api_key:
             try:
                 print("Attempting Cloudflare...")
@@ -385,7 +557,7 @@ class AIService:
             except Exception as e:
                  print(f"Cloudflare Failed: {e}")
 
-        # 4. Try Hugging Face (Tertiary)
+        # 3. Try Hugging Face (Tertiary)
         if self.huggingface_api_key:
             try:
                 print("Attempting Hugging Face...")
@@ -399,41 +571,31 @@ class AIService:
             except Exception as e:
                  print(f"Hugging Face Failed: {e}")
                  
-        # 5. MOCK FALLBACK (Nuclear Option)
+        # 4. MOCK FALLBACK (Nuclear Option)
         return self._mock_generation(prompt)
 
     async def generate_with_gemini(self, prompt: str) -> str:
         if not self.model:
             raise Exception("Gemini model not initialized")
         
-        # Try with the current model first
-        loop = asyncio.get_event_loop()
-        
-        try:
-            response = await loop.run_in_executor(None, lambda: self.model.generate_content(prompt))
-            return response.text
-        except Exception as e:
-            print(f"Primary Gemini model failed, trying fallbacks: {e}")
-
-        # If current model fails, try fallback models
-        for model_name in self.fallback_models:
+        # Current model first, then the fallbacks. Each attempt builds its own
+        # GenerativeModel so concurrent requests never swap a shared object.
+        preferred = self.current_model_name
+        candidates = [preferred] + [m for m in self.fallback_models if m != preferred]
+        for model_name in candidates:
             try:
-                # Update model if needed
-                if self.current_model_name != model_name: # Use current_model_name for comparison
-                    current_model = genai.GenerativeModel(model_name)
-                    self.provider = f"Gemini ({model_name})"
-                    self.current_model_name = model_name # Update current model name
+                if model_name != preferred:
                     print(f"Trying Gemini model: {model_name}")
-                else:
-                    current_model = self.model
-                
-                # Use local variable to avoid closure issues
-                response = await loop.run_in_executor(None, lambda m=current_model: m.generate_content(prompt))
-                
-                # Success - update the instance model
-                self.model = current_model
+                response = await self._gemini_generate(_genai().GenerativeModel(model_name), prompt)
+                if model_name != preferred:
+                    # Remember the working model for later requests
+                    self.current_model_name = model_name
+                    self.provider = f"Gemini ({model_name})"
                 return response.text
             except Exception as e:
+                if type(e).__name__ == "ResourceExhausted" or "429" in str(e):
+                    # Quota is per key, so other models would be throttled too
+                    raise ProviderRateLimited(f"Gemini quota exceeded: {e}", parse_retry_hint(str(e)))
                 print(f"Gemini model {model_name} failed: {e}")
                 # Continue to next model
                 continue
@@ -441,6 +603,40 @@ class AIService:
         # If all models failed
         raise Exception("All Gemini models failed. Please try again later.")
     
+    async def _gemini_generate(self, model, prompt: str):
+        """Call Gemini without tying up FastAPI's default thread pool.
+        
+        Uses the SDK's native async path when available; otherwise runs the
+        blocking call on a dedicated, size-bounded executor.
+        """
+        generate_async = getattr(model, "generate_content_async", None)
+        if generate_async is not None:
+            return await generate_async(prompt)
+        
+        self._gemini_queued += 1
+        def _run():
+            self._gemini_queued -= 1
+            self._gemini_active += 1
+            try:
+                return model.generate_content(prompt)
+            finally:
+                self._gemini_active -= 1
+        job = self._gemini_executor.submit(_run)
+        try:
+            return await asyncio.wrap_future(job)
+        finally:
+            if job.cancelled():
+                # Dropped from the queue before a worker picked it up
+                self._gemini_queued -= 1
+    
+    def get_executor_stats(self) -> Dict[str, int]:
+        """Queue depth and utilisation of the blocking Gemini executor."""
+        return {
+            "max_workers": self.GEMINI_MAX_WORKERS,
+            "active": self._gemini_active,
+            "queued": self._gemini_queued,
+        }
+    
     async def generate_with_huggingface(self, prompt: str, model: str = "google/flan-t5-large") -> str:
         """Generate text using Hugging Face Inference API (free tier)."""
         # Using google/flan-t5-large which is 100% open and reliable
@@ -491,9 +687,11 @@ class AIService:
                         
                     return extracted_text.strip()
                     
-                elif response.status == 503:
-                    # Model is loading, might work on retry
-                    raise Exception("HuggingFace model loading, try again")
+                elif response.status in (429, 503):
+                    # Throttled, or the model is loading; honour the wait hint
+                    text_resp = await response.text()
+                    retry_after = parse_retry_after(response.headers.get("Retry-After")) or parse_retry_hint(text_resp)
+                    raise ProviderRateLimited(f"HuggingFace API error: {response.status} - {text_resp[:200]}", retry_after)
                 else:
                     text_resp = await response.text()
                     try:
@@ -560,9 +758,8 @@ class AIService:
             total_questions = len(questions)
             if type_counts["single"] == total_questions or type_counts["multi"] == total_questions or type_counts["truefalse"] == total_questions:
                 # Calculate proper distribution
-                num_single = max(1, int(total_questions * 0.4))
-                num_multi = max(1, int(total_questions * 0.4))
-                num_tf = max(1, total_questions - num_single - num_multi)
+                split = type_distribution(mode, total_questions)
+                num_single, num_multi = split["single"], split["multi"]
                 
                 # Force convert questions to match distribution
                 for i, q in enumerate(questions):
@@ -747,10 +944,19 @@ class AIService:
 
 > **Note**: These notes were generated in offline mode. Connect to the internet and ensure AI availability for more specific details."""
 
-    async def generate_quiz(self, prompt: str, allow_fallback: bool = True) -> List[Dict[str, Any]]:
-        """Generate quiz with multi-provider fallback and caching."""
+    async def generate_quiz(self, prompt: str, allow_fallback: bool = True, cache_key: Optional[str] = None,
+                            use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Generate quiz with multi-provider fallback and caching.
+        
+        Pass a cache_key from make_cache_key() to cache by request fields
+        instead of by prompt text. use_cache=False skips the response cache
+        (used when the question bank is the cache); identical concurrent
+        calls are still shared.
+        """
+        cache_key = cache_key or self._get_cache_key(prompt)
+        
         # Try to get from cache first
-        cached = self._get_from_cache(prompt)
+        cached = await self._get_from_cache(prompt, cache_key) if use_cache else None
         if cached:
             try:
                 return self._parse_json(cached)
@@ -762,11 +968,16 @@ class AIService:
         used_provider = None
         
         try:
-            text = await self.generate_text(prompt)
-            parsed = self._parse_json(text)
-            # Cache successful response
-            self._save_to_cache(prompt, json.dumps(parsed), self.current_provider or "unknown")
-            return parsed
+            # Identical concurrent requests (e.g. a whole classroom on one
+            # topic) share a single provider call; each caller gets its own
+            # copy because routes mutate the questions in place.
+            parsed = await self._inflight.do(
+                f"quiz:{cache_key}:{int(use_cache)}",
+                lambda: self._generate_quiz_uncached(prompt, cache_key, use_cache)
+            )
+            return copy.deepcopy(parsed)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             print(f"AI generation failed: {e}")
             if not allow_fallback:
@@ -791,12 +1002,265 @@ class AIService:
         offline_quiz = self.generate_offline_quiz(topic, num_questions, difficulty)
         
         # Cache offline response too
-        self._save_to_cache(prompt, json.dumps(offline_quiz), "offline")
+        if use_cache:
+            await self._save_to_cache(prompt, json.dumps(offline_quiz), "offline", cache_key)
         
         return offline_quiz
 
-    async def chat_with_teacher(self, history: List[Dict[str, str]], message: str, user_context: Optional[Dict] = None) -> str:
-        """Chat with the Friendly Teacher persona with personalization and caching."""
+    async def generate_topic_quiz(self, topic: str, num_questions: int, difficulty: str, language: str,
+                                  mode: str, prompt: str, cache_key: str,
+                                  use_cache: bool = True, split: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        """Generate a topic quiz, micro-batched with concurrent compatible requests.
+        
+        With BATCH_ENABLED, small quizzes sharing mode, language and
+        difficulty that arrive within BATCH_WINDOW are asked for in one
+        combined prompt. Otherwise this is generate_quiz(prompt,
+        allow_fallback=False). Either way it raises if the AI fails.
+        use_cache is as for generate_quiz(); split is the per-type count a
+        mixed prompt asks for, when it is not the default distribution.
+        """
+        if not self.BATCH_ENABLED or num_questions > self.BATCH_MAX_QUESTIONS:
+            return await self.generate_quiz(prompt, allow_fallback=False, cache_key=cache_key, use_cache=use_cache)
+        
+        cached = await self._get_from_cache(prompt, cache_key) if use_cache else None
+        if cached:
+            try:
+                return self._parse_json(cached)
+            except Exception as e:
+                print(f"Cache parse error: {e}")
+        
+        group = (mode, self._normalize_key_field(language), self._normalize_key_field(difficulty))
+        item = {"topic": topic, "count": num_questions, "prompt": prompt, "cache_key": cache_key,
+                "use_cache": use_cache, "split": split}
+        try:
+            parsed = await self._inflight.do(f"quiz:{cache_key}:{int(use_cache)}", lambda: self._batcher.submit(group, item))
+            return copy.deepcopy(parsed)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"AI generation failed: {e}")
+            raise Exception(f"AI Generation Failed: {str(e)}")
+
+    def _build_batch_quiz_prompt(self, items: List[Dict[str, Any]], mode: str, language: str, difficulty: str) -> str:
+        types = [MODE_TYPES[mode]] if mode in MODE_TYPES else ["single", "multi", "truefalse"]
+        rules = "\n".join(f'- A "{t}" question has {self.BATCH_FORMAT_RULES[t]}' for t in types)
+        quizzes = []
+        for i, item in enumerate(items, 1):
+            line = f'- "q{i}": {item["count"]} questions about "{item["topic"]}"'
+            if mode not in MODE_TYPES:
+                split = item.get("split") or type_distribution(mode, item["count"])
+                line += f' ({split["single"]} single, {split["multi"]} multi, {split["truefalse"]} truefalse)'
+            quizzes.append(line)
+        quiz_lines = "\n".join(quizzes)
+        return f"""
+        Write several separate HIGH-QUALITY quizzes in {language}.
+        Difficulty: {difficulty}
+        
+        QUESTION FORMAT:
+        {rules}
+        - Every question also has a "prompt" and an "explanation" of why the answer is correct
+        - Test understanding, not trivia; keep wording clear and professional
+        
+        QUIZZES TO WRITE:
+        {quiz_lines}
+        
+        Return ONLY a valid JSON object mapping each key above to its array of questions:
+        {{"q1": [{{"type": "...", "prompt": "...", "choices": [...], "explanation": "..."}}], "q2": [...]}}
+        """
+
+    async def _run_quiz_batch(self, group, items: List[Dict[str, Any]]) -> List[Any]:
+        """MicroBatcher callback: one combined call, split back per caller."""
+        if len(items) == 1:
+            item = items[0]
+            return [await self._generate_quiz_uncached(item["prompt"], item["cache_key"], item["use_cache"])]
+        
+        mode, language, difficulty = group
+        prompt = self._build_batch_quiz_prompt(items, mode, language, difficulty)
+        try:
+            # The combined answer is only useful split up, so only the slices are cached
+            text, provider_name = await self._generate_text_from(prompt, use_cache=False)
+            try:
+                data = self._parse_json(text)
+            except Exception:
+                self._record_bad_output(provider_name)
+                raise
+            if not isinstance(data, dict):
+                raise ValueError("expected an object keyed by quiz")
+        except Exception as e:
+            print(f"⚠️ Batch of {len(items)} quizzes failed ({e}); retrying individually")
+            data, provider_name = {}, "unknown"
+        
+        results: List[Any] = []
+        retry = []
+        for i, item in enumerate(items):
+            try:
+                questions = self._check_batch_slice(data.get(f"q{i + 1}"), item, mode)
+            except Exception as e:
+                if data:
+                    print(f"⚠️ Batched quiz q{i + 1} rejected ({e}); retrying it individually")
+                questions = None
+            if questions is not None:
+                if item["use_cache"]:
+                    await self._save_to_cache(item["prompt"], json.dumps(questions), provider_name, item["cache_key"])
+                results.append(questions)
+            else:
+                results.append(None)
+                retry.append(i)
+        if retry:
+            singles = await asyncio.gather(
+                *(self._generate_quiz_uncached(items[i]["prompt"], items[i]["cache_key"], items[i]["use_cache"]) for i in retry),
+                return_exceptions=True
+            )
+            for i, result in zip(retry, singles):
+                results[i] = result
+        return results
+
+    def _check_batch_slice(self, questions: Any, item: Dict[str, Any], mode: str) -> List[Dict[str, Any]]:
+        """One caller's questions from a batched answer, or ValueError if they don't fit its request.
+        
+        The slice goes through the same parsing as a single quiz answer, then
+        must hold at least the requested number of questions, each of a type
+        the mode allows.
+        """
+        if questions is None:
+            raise ValueError("missing from the batched answer")
+        questions = self._parse_json(questions)
+        if not isinstance(questions, list) or len(questions) < item["count"]:
+            raise ValueError(f"expected {item['count']} questions")
+        allowed = {MODE_TYPES[mode]} if mode in MODE_TYPES else {"single", "multi", "truefalse"}
+        for q in questions:
+            if not isinstance(q, dict) or not q.get("prompt") or q.get("type", "single") not in allowed:
+                raise ValueError("question of the wrong shape or type")
+        return questions
+
+    def get_batch_stats(self) -> Dict[str, Any]:
+        return {"enabled": self.BATCH_ENABLED, **self._batcher.stats()}
+
+    def plan_shards(self, num_questions: int) -> List[int]:
+        """Split a question count into near-equal parallel sub-requests."""
+        shards = min(self.MAX_SHARDS, max(1, math.ceil(num_questions / self.SHARD_SIZE)))
+        base, extra = divmod(num_questions, shards)
+        return [base + (1 if i < extra else 0) for i in range(shards)]
+
+    async def generate_quiz_sharded(self, shard_counts: List[int], mode: str,
+                                    build_prompt: Callable[[int, int], str]) -> List[Dict[str, Any]]:
+        """Generate one quiz as parallel sub-requests and merge the results.
+        
+        build_prompt(index, count) returns the prompt for shard `index`, which
+        should cover a different slice of the material. Near-duplicate
+        questions are dropped and, in mixed mode, the type distribution is
+        enforced over the merged set. Raises only if every shard fails.
+        """
+        results = await asyncio.gather(
+            *(self.generate_quiz(build_prompt(i, count), allow_fallback=False)
+              for i, count in enumerate(shard_counts)),
+            return_exceptions=True
+        )
+        questions = []
+        errors = []
+        for result in results:
+            if isinstance(result, BaseException):
+                errors.append(result)
+            elif isinstance(result, list):
+                questions.extend(q for q in result if isinstance(q, dict))
+        if errors:
+            if not questions:
+                raise errors[0]
+            print(f"⚠️ {len(errors)}/{len(shard_counts)} quiz shards failed: {errors[0]}")
+        
+        questions = remove_near_duplicates(questions, self.DUPLICATE_SIMILARITY)
+        return self.enforce_type_distribution(questions, mode, sum(shard_counts))
+
+    def enforce_type_distribution(self, questions: List[Dict[str, Any]], mode: str, count: int,
+                                  split: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+        """Validate questions, keeping the mixed-mode split of a `count`-question quiz.
+        
+        The split is type_distribution() unless one is given. Questions whose
+        type still has room are kept as they are; the rest are converted to a
+        type that is short, in their original order.
+        """
+        if mode != "mixed":
+            return self.validate_question_types(questions, mode)
+        quotas = dict(split or type_distribution(mode, count))
+        selected: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+        leftovers = []
+        for i, q in enumerate(questions):
+            if quotas.get(q.get("type", "single"), 0) > 0:
+                selected[i] = self._validate_streamed_question(q, mode, quotas)
+            else:
+                leftovers.append(i)
+        for i in leftovers:
+            if sum(quotas.values()) <= 0:
+                break
+            selected[i] = self._validate_streamed_question(questions[i], mode, quotas)
+        return [q for q in selected if q is not None]
+
+    async def generate_quiz_stream(self, prompt: str, mode: str, num_questions: int, cache_key: Optional[str] = None,
+                                   use_cache: bool = True, split: Optional[Dict[str, int]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yield validated questions one at a time as the provider writes them.
+        
+        Each question object is validated as soon as it is complete. In mixed
+        mode the type quotas are enforced incrementally: a question whose type
+        is already full is converted to a type that still has room (quotas
+        come from split when given). At most num_questions questions are
+        yielded; the raw text is still cached unless use_cache is False.
+        """
+        quotas = dict(split or type_distribution(mode, num_questions)) if mode == "mixed" else None
+        parser = JSONArrayStreamParser()
+        emitted = 0
+        provider_name = "unknown"
+        stream = self._text_stream_from(prompt, cache_key, use_cache)
+        try:
+            async for provider_name, chunk in stream:
+                for question in parser.feed(chunk):
+                    if emitted >= num_questions:
+                        continue
+                    question = self._validate_streamed_question(question, mode, quotas)
+                    if question is not None:
+                        emitted += 1
+                        yield question
+        finally:
+            await stream.aclose()
+        if parser.failed:
+            print(f"⚠️ Skipped {parser.failed} unparseable questions in stream")
+            if not emitted:
+                self._record_bad_output(provider_name)
+
+    def _validate_streamed_question(self, question: Dict[str, Any], mode: str, quotas: Optional[Dict[str, int]]) -> Optional[Dict[str, Any]]:
+        if quotas is not None:
+            qtype = question.get("type", "single")
+            if quotas.get(qtype, 0) <= 0:
+                qtype = next((t for t, left in quotas.items() if left > 0), qtype)
+            quotas[qtype] = quotas.get(qtype, 0) - 1
+            question["type"] = qtype
+            # Validate against the single-type rules for the assigned type
+            mode = {"single": "single_only", "multi": "multi_only", "truefalse": "truefalse_only"}.get(qtype, "single_only")
+        try:
+            return self.validate_question_types([question], mode)[0]
+        except Exception as e:
+            print(f"Dropping malformed streamed question: {e}")
+            return None
+
+    def _record_bad_output(self, provider_name: str):
+        """Count unparseable output against the provider that wrote it."""
+        breaker = self._breakers.get(provider_name)
+        if breaker is not None:
+            print(f"❌ {provider_name} returned unparseable JSON")
+            breaker.record_failure()
+
+    async def _generate_quiz_uncached(self, prompt: str, cache_key: str, use_cache: bool = True) -> List[Dict[str, Any]]:
+        text, provider_name = await self._generate_text_from(prompt, cache_key, use_cache)
+        try:
+            parsed = self._parse_json(text)
+        except Exception:
+            self._record_bad_output(provider_name)
+            raise
+        # Cache successful response
+        if use_cache:
+            await self._save_to_cache(prompt, json.dumps(parsed), provider_name, cache_key)
+        return parsed
+
+    def _build_chat_prompt(self, history: List[Dict[str, str]], message: str, user_context: Optional[Dict] = None) -> str:
         system_prompt = (
             "You are a friendly, encouraging, and patient teacher. "
             "Your goal is to help students understand concepts deeply. "
@@ -831,16 +1295,23 @@ class AIService:
             role = "Teacher" if msg['role'] == "model" or msg['role'] == "assistant" else "Student"
             full_prompt += f"{role}: {msg['content']}\n"
         full_prompt += f"Student: {message}\nTeacher:"
-        
+        return full_prompt
+
+    async def chat_with_teacher(self, history: List[Dict[str, str]], message: str, user_context: Optional[Dict] = None) -> str:
+        """Chat with the Friendly Teacher persona with personalization and caching."""
         try:
-            return await self.generate_text(full_prompt)
+            return await self.generate_text(self._build_chat_prompt(history, message, user_context))
         except Exception as e:
             # Fallback response
-            return ("I'm experiencing some technical difficulties, but I'm here to help! "
-                   "Could you rephrase your question? Meanwhile, try breaking down the problem into smaller parts.")
+            return self.CHAT_FALLBACK
 
-    async def explain_concept(self, text: str, context: Optional[str] = None) -> str:
-        """Provide a deep, step-by-step explanation with research-grade quality."""
+    async def stream_chat_with_teacher(self, history: List[Dict[str, str]], message: str, user_context: Optional[Dict] = None) -> AsyncIterator[str]:
+        """Streaming variant of chat_with_teacher."""
+        prompt = self._build_chat_prompt(history, message, user_context)
+        async for chunk in self._stream_with_fallback(prompt, self.CHAT_FALLBACK):
+            yield chunk
+
+    def _build_explain_prompt(self, text: str, context: Optional[str] = None) -> str:
         prompt = (
             f"Act as a premium Academic AI Tutor. Explain the following concept deeply:\n"
             f"Topic: '{text}'\n\n"
@@ -854,18 +1325,42 @@ class AIService:
         )
         if context:
             prompt += f"\nContext from file/quiz: {context}\n"
-        
+        return prompt
+
+    def _explain_fallback(self, text: str) -> str:
+        return (f"**{text}**\n\n"
+                f"This is a concept that requires understanding of fundamental principles. "
+                f"To learn more about {text}, I recommend:\n"
+                f"1. Breaking it down into smaller components\n"
+                f"2. Looking for real-world examples\n"
+                f"3. Practicing with simple exercises\n\n"
+                f"*Note: Using offline mode - for detailed explanations, please try again when online.*")
+
+    async def explain_concept(self, text: str, context: Optional[str] = None) -> str:
+        """Provide a deep, step-by-step explanation with research-grade quality."""
         try:
-            return await self.generate_text(prompt)
+            return await self.generate_text(self._build_explain_prompt(text, context))
         except Exception as e:
             # Fallback explanation
-            return (f"**{text}**\n\n"
-                   f"This is a concept that requires understanding of fundamental principles. "
-                   f"To learn more about {text}, I recommend:\n"
-                   f"1. Breaking it down into smaller components\n"
-                   f"2. Looking for real-world examples\n"
-                   f"3. Practicing with simple exercises\n\n"
-                   f"*Note: Using offline mode - for detailed explanations, please try again when online.*")
+            return self._explain_fallback(text)
+
+    async def stream_explain_concept(self, text: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        """Streaming variant of explain_concept."""
+        prompt = self._build_explain_prompt(text, context)
+        async for chunk in self._stream_with_fallback(prompt, self._explain_fallback(text)):
+            yield chunk
+
+    async def _stream_with_fallback(self, prompt: str, fallback: str) -> AsyncIterator[str]:
+        """Stream a completion, yielding the fallback text if nothing could be generated."""
+        sent = False
+        try:
+            async for chunk in self.generate_text_stream(prompt):
+                sent = True
+                yield chunk
+        except Exception as e:
+            print(f"Streaming failed: {e}")
+            if not sent:
+                yield fallback
 
     async def summarize_text(self, text: str) -> str:
         """Generate a concise summary of the text."""
@@ -917,8 +1412,12 @@ class AIService:
         )
         
         try:
-            text = await self.generate_text(system_prompt)
-            data = self._parse_json(text)
+            text, provider_name = await self._generate_text_from(system_prompt)
+            try:
+                data = self._parse_json(text)
+            except Exception:
+                self._record_bad_output(provider_name)
+                raise
             
             # Validation
             if not isinstance(data, dict) or "slides" not in data:
@@ -939,72 +1438,314 @@ class AIService:
                 ]
             }
 
-    async def generate_text(self, prompt: str) -> str:
+    async def generate_text(self, prompt: str, cache_key: Optional[str] = None, use_cache: bool = True) -> str:
         """Generic text generation with multi-provider fallback and caching."""
+        text, _ = await self._generate_text_from(prompt, cache_key, use_cache)
+        return text
+
+    async def _generate_text_from(self, prompt: str, cache_key: Optional[str] = None,
+                                  use_cache: bool = True) -> Tuple[str, str]:
+        """generate_text() that also returns which provider wrote the text ("cache" for a hit).
+        
+        Concurrent requests run at once, so callers judging the output must
+        use this name rather than current_provider.
+        """
+        cache_key = cache_key or self._get_cache_key(prompt)
+        
         # Check cache first
-        cached = self._get_from_cache(prompt)
+        cached = await self._get_from_cache(prompt, cache_key) if use_cache else None
         if cached:
-            return cached
+            return cached, "cache"
         
+        # Concurrent callers with the same prompt await one provider call
+        return await self._inflight.do(
+            f"{cache_key}:{int(use_cache)}",
+            lambda: self._generate_text_uncached(prompt, cache_key, use_cache)
+        )
+
+    async def _generate_text_uncached(self, prompt: str, cache_key: str, use_cache: bool = True) -> Tuple[str, str]:
         # Compress prompt to save tokens
         compressed_prompt = ' '.join(prompt.split())
         
-        # Try providers in priority order with timeout and cooldown checks
-        providers = []
+        providers = self._ranked_providers()
+
+        if self.HEDGE_ENABLED and len(providers) > 1:
+            response, provider_name = await self._generate_hedged(providers, compressed_prompt)
+        else:
+            response, provider_name = await self._generate_sequential(providers, compressed_prompt)
         
-        # Build provider list based on availability and cooldown status
-        if self.gemini_api_key and not self._is_provider_on_cooldown("gemini"):
-            providers.append(("gemini", self.generate_with_gemini))
+        # Success!
+        self.current_provider = provider_name
+        if use_cache:
+            await self._save_to_cache(prompt, response, provider_name, cache_key)
+        return response, provider_name
+
+    def _ranked_providers(self):
+        """Configured, available providers in priority order, degraded ones last."""
+        # Configured providers in static priority order (the tie-breaker for ranking)
+        configured = []
+        if self.gemini_api_key:
+            configured.append(("gemini", self.generate_with_gemini))
         
-        if self.cloudflare_api_key and self.cloudflare_account_id and not self._is_provider_on_cooldown("cloudflare"):
-            providers.append(("cloudflare", self.generate_with_cloudflare))
+        if self.cloudflare_api_key and self.cloudflare_account_id:
+            configured.append(("cloudflare", self.generate_with_cloudflare))
         
-        if self.huggingface_api_key and not self._is_provider_on_cooldown("huggingface"):
-            providers.append(("huggingface", self.generate_with_huggingface))
+        if self.huggingface_api_key:
+            configured.append(("huggingface", self.generate_with_huggingface))
         
-        if not providers:
+        if not configured:
              raise Exception("No active AI providers found. Please check your API keys in .env file.")
+        
+        # Skip providers whose circuit is open. Healthy providers all score 0,
+        # so the stable sort keeps the priority order and only moves a
+        # provider that is erroring or slow for itself down the list
+        providers = [p for p in configured if self._breakers[p[0]].is_available()]
+        providers.sort(key=lambda p: self._breakers[p[0]].score())
+        if not providers:
+            raise Exception("All AI providers are temporarily unavailable (circuit open). Please try again shortly.")
+        return providers
+
+    def context_budget(self) -> int:
+        """Token budget for document context, for the provider most likely to serve the prompt."""
+        try:
+            provider = self._ranked_providers()[0][0]
+        except Exception:
+            return min(self.CONTEXT_TOKEN_BUDGETS.values())
+        return self.CONTEXT_TOKEN_BUDGETS.get(provider, 1500)
+
+    async def generate_text_stream(self, prompt: str, cache_key: Optional[str] = None,
+                                   use_cache: bool = True) -> AsyncIterator[str]:
+        """Stream generated text chunk by chunk as the provider produces it.
+        
+        A cache hit is yielded as one chunk. Gemini and Cloudflare stream
+        natively; HuggingFace yields its whole answer at once. A provider
+        that fails before its first chunk falls through to the next one.
+        The full text is cached once the stream completes, unless use_cache
+        is False, which also skips the lookup.
+        """
+        stream = self._text_stream_from(prompt, cache_key, use_cache)
+        try:
+            async for _, chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
 
-        # Try each provider
+    async def _text_stream_from(self, prompt: str, cache_key: Optional[str] = None,
+                                use_cache: bool = True) -> AsyncIterator[Tuple[str, str]]:
+        """generate_text_stream() yielding (provider name, chunk); "cache" for a hit."""
+        cache_key = cache_key or self._get_cache_key(prompt)
+        cached = await self._get_from_cache(prompt, cache_key) if use_cache else None
+        if cached:
+            yield "cache", cached
+            return
+        
+        compressed_prompt = ' '.join(prompt.split())
+        streamers = {"gemini": self.stream_with_gemini, "cloudflare": self.stream_with_cloudflare}
+        est_tokens = len(compressed_prompt) // 4 + self.EXPECTED_OUTPUT_TOKENS
         errors = []
-        for provider_name, provider_func in providers:
+        for provider_name, provider_func in self._ranked_providers():
+            breaker = self._breakers[provider_name]
+            limiter = self._rate_limiters.get(provider_name)
+            if not breaker.allow_request():
+                continue
+            judged = False
+            parts = []
             try:
-                print(f"🤖 Trying {provider_name}...")
-                
-                # Set timeout for each provider
-                if provider_name == "gemini":
-                     response = await provider_func(compressed_prompt)
-                else:
-                    response = await asyncio.wait_for(
-                        provider_func(compressed_prompt),
-                        timeout=self.PROVIDER_TIMEOUT
-                    )
+                if limiter and not await limiter.acquire(est_tokens, self.RATE_LIMIT_MAX_WAIT):
+                    errors.append(f"{provider_name}: rate limit reached")
+                    continue
+                print(f"🤖 Streaming from {provider_name}...")
+                started = time.monotonic()
+                try:
+                    if provider_name in streamers:
+                        async for chunk in streamers[provider_name](compressed_prompt):
+                            if chunk:
+                                parts.append(chunk)
+                                yield provider_name, chunk
+                    else:
+                        text = await asyncio.wait_for(provider_func(compressed_prompt), timeout=self.PROVIDER_TIMEOUT)
+                        if text:
+                            parts.append(text)
+                            yield provider_name, text
+                    if not parts:
+                        raise Exception("Empty response")
+                except ProviderRateLimited as e:
+                    if limiter:
+                        limiter.defer(e.retry_after)
+                    if parts:
+                        raise
+                    errors.append(f"{provider_name}: {str(e)[:200]}")
+                    continue
+                except (asyncio.CancelledError, GeneratorExit):
+                    raise
+                except Exception as e:
+                    judged = True
+                    breaker.record_failure()
+                    print(f"❌ {provider_name} stream failed: {str(e)[:200]}")
+                    if parts:
+                        # Can't restart transparently once text reached the client
+                        raise
+                    errors.append(f"{provider_name}: {str(e)[:200]}")
+                    continue
                 
-                # Success!
+                judged = True
+                breaker.record_success(time.monotonic() - started)
                 self.current_provider = provider_name
-                self._mark_provider_success(provider_name)
-                self._save_to_cache(prompt, response, provider_name)
+                if use_cache:
+                    await self._save_to_cache(prompt, "".join(parts), provider_name, cache_key)
+                return
+            finally:
+                if not judged:
+                    breaker.release()
+        
+        error_details = " | ".join(errors)
+        raise Exception(f"All AI providers failed. Details: {error_details}")
+
+    async def _call_provider(self, provider_name: str, provider_func, prompt: str) -> str:
+        """Run one provider call within its rate limit, with timeout and retries.
+        
+        The call waits for the provider's token buckets only up to
+        RATE_LIMIT_MAX_WAIT; beyond that it fails fast so the caller can
+        reroute. A 429/503 from the provider is retried with jittered
+        backoff that honours Retry-After. These throttling errors do not
+        count toward the provider's failure threshold.
+        """
+        limiter = self._rate_limiters.get(provider_name)
+        breaker = self._breakers[provider_name]
+        est_tokens = len(prompt) // 4 + self.EXPECTED_OUTPUT_TOKENS
+        
+        if not breaker.allow_request():
+            raise Exception(f"{provider_name} circuit open, rerouting")
+        judged = False
+        try:
+            for attempt in range(self.MAX_RATE_LIMIT_RETRIES + 1):
+                if limiter and not await limiter.acquire(est_tokens, self.RATE_LIMIT_MAX_WAIT):
+                    raise Exception(f"{provider_name} rate limit reached, rerouting")
+                
+                print(f"🤖 Trying {provider_name}...")
+                started = time.monotonic()
+                try:
+                    # Set timeout for each provider
+                    if provider_name == "gemini":
+                        response = await provider_func(prompt)
+                    else:
+                        response = await asyncio.wait_for(
+                            provider_func(prompt),
+                            timeout=self.PROVIDER_TIMEOUT
+                        )
+                    if not response:
+                        raise Exception("Empty response")
+                except asyncio.CancelledError:
+                    raise
+                except ProviderRateLimited as e:
+                    if limiter:
+                        limiter.defer(e.retry_after)
+                    wait = backoff_delay(attempt, e.retry_after)
+                    if attempt < self.MAX_RATE_LIMIT_RETRIES and wait <= self.RATE_LIMIT_MAX_WAIT:
+                        print(f"⏳ {provider_name} throttled, retrying in {wait:.1f}s")
+                        await asyncio.sleep(wait)
+                        continue
+                    print(f"⏳ {provider_name} throttled: {str(e)[:200]}")
+                    raise
+                except asyncio.TimeoutError:
+                    print(f"⏱️ {provider_name} timeout")
+                    judged = True
+                    breaker.record_failure()
+                    raise Exception(f"{provider_name} timeout")
+                except Exception as e:
+                    print(f"❌ {provider_name} failed: {str(e)[:200]}")
+                    judged = True
+                    breaker.record_failure()
+                    raise
+                
+                latency = time.monotonic() - started
+                self._provider_latencies.setdefault(provider_name, deque(maxlen=self.LATENCY_WINDOW)).append(latency)
+                judged = True
+                breaker.record_success(latency)
                 print(f"✓ {provider_name} succeeded")
                 return response
-                
-            except asyncio.TimeoutError:
-                msg = f"{provider_name} timeout"
-                print(f"⏱️ {msg}")
-                errors.append(msg)
-                self._mark_provider_failure(provider_name)
-                continue
+            
+            raise Exception(f"{provider_name} still throttled after retries")
+        finally:
+            # Cancelled, rerouted or throttled calls say nothing about health;
+            # hand back the half-open probe slot if we held one
+            if not judged:
+                breaker.release()
+
+    def get_rate_limit_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-provider limiter counters (waits, reroutes, provider throttles)."""
+        return {name: limiter.stats() for name, limiter in self._rate_limiters.items()}
+
+    async def _generate_sequential(self, providers, prompt: str):
+        """Try each provider in order until one answers."""
+        errors = []
+        for provider_name, provider_func in providers:
+            try:
+                return await self._call_provider(provider_name, provider_func, prompt), provider_name
             except Exception as e:
-                err_msg = str(e)[:200]
-                print(f"❌ {provider_name} failed: {err_msg}")
-                errors.append(f"{provider_name}: {err_msg}")
-                self._mark_provider_failure(provider_name)
-                continue
+                errors.append(f"{provider_name}: {str(e)[:200]}")
+        
+        # All providers failed - return a detailed error message
+        error_details = " | ".join(errors)
+        raise Exception(f"All AI providers failed. Details: {error_details}")
+
+    def _hedge_delay(self, provider_name: str) -> float:
+        """Seconds to wait on a provider before hedging: its HEDGE_PERCENTILE latency."""
+        samples = sorted(self._provider_latencies.get(provider_name, ()))
+        if len(samples) < self.HEDGE_MIN_SAMPLES:
+            return self.HEDGE_DEFAULT_DELAY
+        index = min(len(samples) - 1, int(len(samples) * self.HEDGE_PERCENTILE))
+        return max(self.HEDGE_MIN_DELAY, samples[index])
+
+    async def _generate_hedged(self, providers, prompt: str):
+        """Start the next provider in parallel when the current one is slow.
+        
+        The first valid response wins and the remaining calls are cancelled.
+        A provider failing outright starts the next one immediately.
+        """
+        queue = list(providers)
+        running = {}
+        errors = []
+        hedges = set()
+        
+        def launch(hedge: bool):
+            name, func = queue.pop(0)
+            running[asyncio.ensure_future(self._call_provider(name, func, prompt))] = name
+            if hedge:
+                hedges.add(name)
+                self._hedge_stats.setdefault(name, {"fired": 0, "won": 0})["fired"] += 1
+                print(f"🏁 Hedging with {name}")
+            return name
+        
+        last_launched = launch(hedge=False)
+        try:
+            while running:
+                timeout = self._hedge_delay(last_launched) if queue else None
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    last_launched = launch(hedge=True)
+                    continue
+                for task in done:
+                    name = running.pop(task)
+                    if task.exception() is None:
+                        if name in hedges:
+                            self._hedge_stats.setdefault(name, {"fired": 0, "won": 0})["won"] += 1
+                        return task.result(), name
+                    errors.append(f"{name}: {str(task.exception())[:200]}")
+                if not running and queue:
+                    last_launched = launch(hedge=False)
+        finally:
+            # Cancel the losers (or everything, if our caller was cancelled)
+            for task in running:
+                task.cancel()
         
-        # All providers failed, check cache for any similar past responses
-        # (This is a last resort - return a detailed error message)
         error_details = " | ".join(errors)
         raise Exception(f"All AI providers failed. Details: {error_details}")
 
+    def get_hedge_stats(self) -> Dict[str, Dict[str, int]]:
+        """Per-provider counts of hedge requests fired and won."""
+        return self._hedge_stats
+
     def _parse_json(self, text: Any) -> List[Dict[str, Any]]:
         if isinstance(text, list):
             return text
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from utils.sqlite_store import ThreadedStore
+
+
+def artifact_key(content: Dict[str, Any], fmt: str, options: Dict[str, Any]) -> str:
+    """Content address of a rendered document.
+
+    Hashes only what the renderers draw (slide titles and bullet points,
+    whitespace-normalised) plus the format and the styling options the
+    renderers apply (theme, font style), so content that differs in unused
+    fields (layout hints, visual cues, colour palette) still shares one
+    artifact.
+    """
+    slides = [
+        {
+            "title": " ".join(str(slide.get("title", "")).split()),
+            "content": [" ".join(str(point).split()) for point in slide.get("content", [])],
+        }
+        for slide in content.get("slides", [])
+        if isinstance(slide, dict)
+    ]
+    normalized = {
+        "slides": slides,
+        "format": fmt,
+        "topic": " ".join(str(options.get("topic", "")).split()),
+        "theme": options.get("theme"),
+        "font_style": options.get("font_style"),
+    }
+    blob = json.dumps(normalized, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ArtifactCache(ThreadedStore):
+    """Size-bounded on-disk store of rendered documents, evicted LRU.
+
+    Each artifact is one file named by its content hash, so identical
+    renders share a file and a key doubles as an ETag. The LRU index is
+    rebuilt from file access times on first use; when the stored bytes
+    exceed max_bytes the least recently used files are deleted.
+
+    Requests are also remembered for ALIAS_TTL seconds (request signature
+    -> artifact key), so repeating a request can be answered from disk
+    without generating or rendering anything.
+    """
+
+    ALIAS_TTL = int(os.getenv("ARTIFACT_ALIAS_TTL", str(24 * 3600)))  # seconds
+    MAX_ALIASES = 5000
+
+    def __init__(self, directory: str = "artifact_cache", max_bytes: Optional[int] = None):
+        super().__init__("artifact-cache")
+        self.directory = directory
+        self.max_bytes = max_bytes or int(os.getenv("ARTIFACT_CACHE_MB", "256")) * 1024 * 1024
+        self._index: Optional["OrderedDict[str, int]"] = None  # file name -> size, LRU first
+        self._total_bytes = 0
+        self._aliases: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- storage (runs on the cache thread) ---
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        if self._index is None:
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_atime, entry.name, stat.st_size))
+            self._index = OrderedDict((name, size) for _, name, size in sorted(entries))
+            self._total_bytes = sum(self._index.values())
+        return self._index
+
+    def _get_sync(self, name: str) -> Optional[str]:
+        index = self._load_index()
+        path = os.path.join(self.directory, name)
+        if name not in index:
+            return None
+        if not os.path.exists(path):
+            self._total_bytes -= index.pop(name)
+            return None
+        index.move_to_end(name)
+        try:
+            os.utime(path)  # keeps the LRU order across restarts
+        except OSError:
+            pass
+        return path
+
+    def _put_sync(self, name: str, data: bytes) -> str:
+        index = self._load_index()
+        path = os.path.join(self.directory, name)
+        if name not in index:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            index[name] = len(data)
+            self._total_bytes += len(data)
+        index.move_to_end(name)
+        self._evict_sync(keep=name)
+        return path
+
+    def _evict_sync(self, keep: str):
+        index = self._index
+        while self._total_bytes > self.max_bytes and len(index) > 1:
+            name, size = next(iter(index.items()))
+            if name == keep:
+                break
+            del index[name]
+            self._total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    # --- public API ---
+
+    async def get(self, key: str, ext: str) -> Optional[str]:
+        """Path of a cached artifact, or None."""
+        path = await self._run(self._get_sync, f"{key}.{ext}")
+        if path:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return path
+
+    async def put(self, key: str, ext: str, data: bytes) -> str:
+        """Store an artifact and return its path."""
+        return await self._run(self._put_sync, f"{key}.{ext}", data)
+
+    def remember(self, request_key: str, key: str):
+        self._aliases[request_key] = (key, time.time() + self.ALIAS_TTL)
+        self._aliases.move_to_end(request_key)
+        while len(self._aliases) > self.MAX_ALIASES:
+            self._aliases.popitem(last=False)
+
+    def recall(self, request_key: str) -> Optional[str]:
+        """Artifact key last produced for this request signature, if still fresh."""
+        alias = self._aliases.get(request_key)
+        if alias is None:
+            return None
+        key, expires = alias
+        if expires < time.time():
+            del self._aliases[request_key]
+            return None
+        return key
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._index) if self._index is not None else None,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "aliases": len(self._aliases),
+        }
+
+
+artifact_cache = ArtifactCache()
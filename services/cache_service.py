@@ -0,0 +1,427 @@
+import asyncio
+import sqlite3
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # optional, zlib is always available
+    zstandard = None
+
+from utils.sqlite_store import SQLiteStore
+
+# Compressed payloads are stored as BLOBs prefixed with a format marker.
+# Plain TEXT rows (written before compression existed) are returned as-is.
+ZLIB_MARKER = b"Z1"
+ZSTD_MARKER = b"ZS"
+COMPRESS_MIN_BYTES = 256
+
+
+def compress_payload(text: str) -> Union[str, bytes]:
+    """Compress a cache payload, keeping short strings as plain text."""
+    raw = text.encode('utf-8')
+    if len(raw) < COMPRESS_MIN_BYTES:
+        return text
+    if zstandard is not None:
+        return ZSTD_MARKER + zstandard.ZstdCompressor(level=6).compress(raw)
+    return ZLIB_MARKER + zlib.compress(raw, 6)
+
+
+def decompress_payload(value: Union[str, bytes]) -> str:
+    """Inverse of compress_payload; also accepts legacy uncompressed rows."""
+    if isinstance(value, str):
+        return value
+    marker, body = bytes(value[:2]), bytes(value[2:])
+    if marker == ZLIB_MARKER:
+        return zlib.decompress(body).decode('utf-8')
+    if marker == ZSTD_MARKER:
+        if zstandard is None:
+            raise ValueError("zstd-compressed cache entry but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(body).decode('utf-8')
+    return bytes(value).decode('utf-8')
+
+
+class CacheBackend:
+    """Interface for AI response cache stores.
+
+    AIService only talks to this interface, so the SQLite store below can be
+    swapped for a shared store (Redis, Postgres, ...) without touching callers.
+    """
+
+    async def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """Return (response, provider) for a key, or None on a miss."""
+        raise NotImplementedError
+
+    async def set(self, key: str, prompt: str, response: str, provider: str):
+        """Insert or replace a cached response."""
+        raise NotImplementedError
+
+    async def cleanup(self):
+        """Evict entries until the store is back within its size budget."""
+        raise NotImplementedError
+
+    async def record_hits(self, hits: Dict[str, int]):
+        """Apply a batch of deferred access-count increments."""
+        raise NotImplementedError
+
+    async def invalidate_prefix(self, prefix: str, keep_prefix: Optional[str] = None) -> int:
+        """Delete keys starting with prefix (except those starting with keep_prefix)."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Return hit/miss counters, keyed by tier name."""
+        return {}
+
+    async def close(self):
+        """Release any connections held by the backend."""
+        raise NotImplementedError
+
+
+class SQLiteCacheBackend(SQLiteStore, CacheBackend):
+    """SQLite cache with one long-lived WAL connection, driven off the event loop.
+
+    Responses of COMPRESS_MIN_BYTES or more are stored compressed (zstd when
+    installed, zlib otherwise), and the byte budget counts compressed size.
+
+    Writes are write-behind: set() only records the entry in a pending map
+    (so repeated writes to the same key coalesce) and a background flush
+    commits the batch. Eviction runs after a flush only when the stored
+    payload size crosses the high-water mark of the byte budget, and then
+    trims down to the low-water mark, so write latency stays flat.
+    """
+
+    WRITE_BATCH_SIZE = 50
+    WRITE_FLUSH_DELAY = 0.5  # seconds
+    HIGH_WATER = 1.0  # fraction of max_bytes that triggers eviction
+    LOW_WATER = 0.8  # fraction of max_bytes eviction trims down to
+
+    def __init__(self, db_path: str = "ai_cache.db", max_bytes: int = 64 * 1024 * 1024):
+        super().__init__(db_path, "ai-cache")
+        self.max_bytes = max_bytes
+        self._pending_writes: Dict[str, Tuple[str, str, str, datetime]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.flushes = 0
+        self.dropped_writes = 0
+        self.evictions = 0
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                prompt_hash TEXT PRIMARY KEY,
+                prompt TEXT,
+                response TEXT,
+                provider TEXT,
+                created_at TIMESTAMP,
+                access_count INTEGER DEFAULT 1,
+                size_bytes INTEGER DEFAULT 0
+            )
+        ''')
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(ai_cache)')]
+        if 'size_bytes' not in columns:
+            # Databases created before the byte budget existed
+            conn.execute('ALTER TABLE ai_cache ADD COLUMN size_bytes INTEGER DEFAULT 0')
+            conn.execute('UPDATE ai_cache SET size_bytes = LENGTH(CAST(response AS BLOB)) + LENGTH(prompt)')
+        # Index for hybrid frequency/recency cache eviction
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_access_count ON ai_cache(access_count DESC, created_at DESC)')
+        conn.commit()
+        self._total_bytes = conn.execute('SELECT COALESCE(SUM(size_bytes), 0) FROM ai_cache').fetchone()[0]
+
+    def init_sync(self):
+        """Create the schema eagerly (safe to call outside an event loop)."""
+        self._executor.submit(self._connect).result()
+
+    def _get_sync(self, key: str) -> Optional[Tuple[str, str]]:
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT response, provider FROM ai_cache WHERE prompt_hash = ?',
+            (key,)
+        ).fetchone()
+        return (decompress_payload(row[0]), row[1]) if row else None
+
+    def _record_hits_sync(self, hits: Dict[str, int]):
+        conn = self._connect()
+        conn.executemany(
+            'UPDATE ai_cache SET access_count = access_count + ? WHERE prompt_hash = ?',
+            [(count, key) for key, count in hits.items()]
+        )
+        conn.commit()
+
+    def _write_batch_sync(self, batch: Dict[str, Tuple[str, str, str, datetime]]):
+        conn = self._connect()
+        keys = list(batch)
+        placeholders = ','.join('?' * len(keys))
+        replaced = conn.execute(
+            f'SELECT COALESCE(SUM(size_bytes), 0) FROM ai_cache WHERE prompt_hash IN ({placeholders})',
+            keys
+        ).fetchone()[0]
+        rows = []
+        added = 0
+        for key, (prompt, response, provider, created_at) in batch.items():
+            stored = compress_payload(response)
+            # The byte budget counts what actually lands on disk
+            size = (len(stored) if isinstance(stored, bytes) else len(stored.encode('utf-8'))) + len(prompt)
+            added += size
+            rows.append((key, prompt, stored, provider, created_at, size))
+        conn.executemany('''
+            INSERT OR REPLACE INTO ai_cache
+            (prompt_hash, prompt, response, provider, created_at, access_count, size_bytes)
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+        ''', rows)
+        conn.commit()
+        self._total_bytes += added - replaced
+        if self._total_bytes > self.max_bytes * self.HIGH_WATER:
+            self._evict_sync()
+
+    def _evict_sync(self):
+        """Drop least-used, oldest entries until under the low-water mark."""
+        conn = self._connect()
+        target = int(self.max_bytes * self.LOW_WATER)
+        excess = self._total_bytes - target
+        if excess <= 0:
+            return
+        victims = []
+        freed = 0
+        for key, size in conn.execute(
+            'SELECT prompt_hash, size_bytes FROM ai_cache ORDER BY access_count ASC, created_at ASC'
+        ):
+            victims.append((key,))
+            freed += size or 0
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM ai_cache WHERE prompt_hash = ?', victims)
+        conn.commit()
+        self._total_bytes -= freed
+        self.evictions += len(victims)
+
+    def _invalidate_prefix_sync(self, prefix: str, keep_prefix: Optional[str]) -> int:
+        conn = self._connect()
+        where = "prompt_hash >= ? AND prompt_hash < ?"
+        # Range scan on the primary key instead of LIKE (which can't use it)
+        params = [prefix, prefix + '\uffff']
+        if keep_prefix:
+            where += " AND NOT (prompt_hash >= ? AND prompt_hash < ?)"
+            params += [keep_prefix, keep_prefix + '\uffff']
+        freed = conn.execute(f'SELECT COALESCE(SUM(size_bytes), 0) FROM ai_cache WHERE {where}', params).fetchone()[0]
+        cursor = conn.execute(f'DELETE FROM ai_cache WHERE {where}', params)
+        conn.commit()
+        self._total_bytes -= freed
+        return cursor.rowcount
+
+    async def get(self, key: str) -> Optional[Tuple[str, str]]:
+        pending = self._pending_writes.get(key)
+        if pending is not None:
+            self.hits += 1
+            return pending[1], pending[2]
+        result = await self._run(self._get_sync, key)
+        if result:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    async def set(self, key: str, prompt: str, response: str, provider: str):
+        self._pending_writes[key] = (prompt, response, provider, datetime.now())
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Give concurrent writers a short window to join the batch, but
+        # flush straight away once a full batch is waiting.
+        deadline = time.monotonic() + self.WRITE_FLUSH_DELAY
+        while len(self._pending_writes) < self.WRITE_BATCH_SIZE and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        await self.flush()
+
+    async def flush(self):
+        """Commit all pending writes in one transaction.
+        
+        A failed batch goes back into the pending map (newer writes to the
+        same keys win) and is retried once after WRITE_FLUSH_DELAY; if that
+        fails too it is dropped and counted in dropped_writes.
+        """
+        failed = False
+        while self._pending_writes:
+            batch, self._pending_writes = self._pending_writes, {}
+            try:
+                await self._run(self._write_batch_sync, batch)
+                self.flushes += 1
+                failed = False
+            except Exception as e:
+                if failed:
+                    self.dropped_writes += len(batch)
+                    print(f"Cache write error, dropped {len(batch)} entries: {e}")
+                    failed = False
+                    continue
+                print(f"Cache write error, retrying: {e}")
+                self._pending_writes = {**batch, **self._pending_writes}
+                failed = True
+                await asyncio.sleep(self.WRITE_FLUSH_DELAY)
+
+    async def cleanup(self):
+        await self.flush()
+        await self._run(self._evict_sync)
+
+    async def record_hits(self, hits: Dict[str, int]):
+        if hits:
+            await self._run(self._record_hits_sync, hits)
+
+    async def invalidate_prefix(self, prefix: str, keep_prefix: Optional[str] = None) -> int:
+        await self.flush()
+        return await self._run(self._invalidate_prefix_sync, prefix, keep_prefix)
+
+    async def close(self):
+        await self.flush()
+        await super().close()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "sqlite": {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes": self._total_bytes,
+                "pending_writes": len(self._pending_writes),
+                "flushes": self.flushes,
+                "dropped_writes": self.dropped_writes,
+                "evictions": self.evictions,
+            }
+        }
+
+
+class MemoryLRUCache:
+    """Bounded in-process LRU with entry-count, byte and TTL limits."""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 16 * 1024 * 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[str, str, float, int]]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _entry_size(key: str, response: str, provider: str) -> int:
+        return len(key) + len(response.encode('utf-8')) + len(provider)
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        response, provider, expires_at, _ = entry
+        if time.monotonic() >= expires_at:
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return response, provider
+
+    def set(self, key: str, response: str, provider: str):
+        size = self._entry_size(key, response, provider)
+        if size > self.max_bytes:
+            return  # Never let a single huge entry flush the whole tier
+        self._remove(key)
+        self._data[key] = (response, provider, time.monotonic() + self.ttl, size)
+        self.size_bytes += size
+        while self._data and (len(self._data) > self.max_entries or self.size_bytes > self.max_bytes):
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+
+    def remove_prefix(self, prefix: str, keep_prefix: Optional[str] = None):
+        for key in [k for k in self._data if k.startswith(prefix)]:
+            if not (keep_prefix and key.startswith(keep_prefix)):
+                self._remove(key)
+
+    def _remove(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[3]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TieredCache(CacheBackend):
+    """L1 in-memory LRU in front of a persistent L2 backend.
+
+    L1 hits never touch disk: their access-count increments are collected
+    and flushed to L2 in one batched UPDATE once HIT_FLUSH_THRESHOLD hits
+    have accumulated or HIT_FLUSH_INTERVAL seconds have passed.
+    """
+
+    HIT_FLUSH_THRESHOLD = 100
+    HIT_FLUSH_INTERVAL = 30  # seconds
+
+    def __init__(self, l2: CacheBackend, l1: Optional[MemoryLRUCache] = None):
+        self.l1 = l1 if l1 is not None else MemoryLRUCache()
+        self.l2 = l2
+        self._pending_hits: Dict[str, int] = {}
+        self._last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def init_sync(self):
+        if hasattr(self.l2, "init_sync"):
+            self.l2.init_sync()
+
+    def _note_hit(self, key: str):
+        self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+        due = (len(self._pending_hits) >= self.HIT_FLUSH_THRESHOLD
+               or time.monotonic() - self._last_flush >= self.HIT_FLUSH_INTERVAL)
+        if due and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush_hits())
+
+    async def flush_hits(self):
+        """Write deferred access counts to L2."""
+        hits, self._pending_hits = self._pending_hits, {}
+        self._last_flush = time.monotonic()
+        try:
+            await self.l2.record_hits(hits)
+        except Exception as e:
+            print(f"Cache hit flush error: {e}")
+
+    async def get(self, key: str) -> Optional[Tuple[str, str]]:
+        result = self.l1.get(key)
+        if result is None:
+            result = await self.l2.get(key)
+            if result is None:
+                return None
+            self.l1.set(key, result[0], result[1])
+        self._note_hit(key)
+        return result
+
+    async def set(self, key: str, prompt: str, response: str, provider: str):
+        self.l1.set(key, response, provider)
+        await self.l2.set(key, prompt, response, provider)
+
+    async def cleanup(self):
+        await self.l2.cleanup()
+
+    async def record_hits(self, hits: Dict[str, int]):
+        await self.l2.record_hits(hits)
+
+    async def invalidate_prefix(self, prefix: str, keep_prefix: Optional[str] = None) -> int:
+        self.l1.remove_prefix(prefix, keep_prefix)
+        return await self.l2.invalidate_prefix(prefix, keep_prefix)
+
+    async def close(self):
+        await self.flush_hits()
+        await self.l2.close()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {
+            "memory": {
+                "hits": self.l1.hits,
+                "misses": self.l1.misses,
+                "entries": len(self.l1),
+                "bytes": self.l1.size_bytes,
+            }
+        }
+        stats.update(self.l2.stats())
+        return stats
@@ -1,47 +1,162 @@
+import asyncio
 import os
-import pypdf
-import docx2txt
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
 import anyio
 
+from services.cache_service import SQLiteCacheBackend
+from services.upload_service import StoredUpload
+from utils.file_processing import count_pdf_pages_file, extract_document, extract_document_file
+from utils.process_pool import WorkerPool
+
+
 class FileService:
-    @staticmethod
-    async def extract_text(filepath: str) -> str:
-        ext = filepath.lower().split('.')[-1]
+    """Single entry point for turning uploaded documents into text.
+
+    PDF and DOCX parsing is CPU-bound and holds the GIL, so it runs in a
+    small process pool instead of on the event loop or in threads. Each job
+    is limited to MAX_PAGES pages and JOB_TIMEOUT seconds; a job that runs
+    over its time is abandoned and the pool is recycled so the stuck worker
+    does not hold a slot. Plain text is decoded inline.
+
+    Prompts only need a budget of text, so extract_for_prompt() stops once
+    PROMPT_CHAR_BUDGET characters have been sampled from pages spread over
+    the document. The library needs everything; extract_full() splits large
+    PDFs into page ranges handled by all workers at once.
+
+    Results are cached by the upload's SHA-256, so re-uploading the same
+    file skips extraction entirely.
+    """
+
+    MAX_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(min(2, os.cpu_count() or 1))))
+    JOB_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "30"))  # seconds
+    MAX_PAGES = int(os.getenv("EXTRACT_MAX_PAGES", "300"))
+    POOLED_TYPES = ('pdf', 'docx', 'doc')
+    PROMPT_CHAR_BUDGET = int(os.getenv("EXTRACT_PROMPT_CHARS", "60000"))  # sampled for context selection
+    PARALLEL_MIN_PAGES = 40  # full extractions of longer PDFs are split across workers
+    TEXT_CACHE_BYTES = 128 * 1024 * 1024  # extracted text, compressed, keyed by file hash
+
+    def __init__(self):
+        self._pool = WorkerPool(self.MAX_WORKERS, self.JOB_TIMEOUT)
+        self.jobs = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.engines: Dict[str, int] = {}
+        self.cache_hits = 0
+        self._text_cache = SQLiteCacheBackend("extract_cache.db", self.TEXT_CACHE_BYTES)
+
+    async def extract_for_prompt(self, upload: StoredUpload) -> str:
+        """Enough text, sampled across the document, to build a prompt from.
         
+        Raises ValueError if the file cannot be read.
+        """
+        key = f"prompt:{self.PROMPT_CHAR_BUDGET}:{upload.extension}:{upload.sha256}"
+        # A cached full extraction of the same file serves prompts too
+        cached = await self._cached_text(key, f"full:{upload.extension}:{upload.sha256}")
+        if cached is not None:
+            return cached
+        result = await self.extract_document(upload, char_budget=self.PROMPT_CHAR_BUDGET)
+        await self._text_cache.set(key, upload.filename, result["text"], result["engine"])
+        return result["text"]
+
+    async def extract_full(self, upload: StoredUpload) -> str:
+        """All of a document's text, with large PDFs parsed by every worker in parallel."""
+        key = f"full:{upload.extension}:{upload.sha256}"
+        cached = await self._cached_text(key)
+        if cached is not None:
+            return cached
+        text, engine = await self._extract_full_uncached(upload)
+        await self._text_cache.set(key, upload.filename, text, engine)
+        return text
+
+    async def _cached_text(self, *keys: str) -> Optional[str]:
+        for key in keys:
+            try:
+                cached = await self._text_cache.get(key)
+            except Exception as e:
+                print(f"Extraction cache read error: {e}")
+                return None
+            if cached:
+                self.cache_hits += 1
+                return cached[0]
+        return None
+
+    async def extract_document(self, upload: StoredUpload, max_pages: Optional[int] = None,
+                               char_budget: Optional[int] = None) -> Dict[str, Any]:
+        """Extract a stored upload, returning the text with the engine and page counts."""
+        max_pages = max_pages or self.MAX_PAGES
+        self.jobs += 1
+        if upload.extension in self.POOLED_TYPES:
+            result = await self._run_in_pool(upload.filename, extract_document_file, upload.path,
+                                             upload.filename, max_pages, char_budget)
+        else:
+            # Plain text (or an unsupported type, which raises) needs no worker
+            content = await anyio.Path(upload.path).read_bytes()
+            result = extract_document(upload.filename, content)
+        self._count_engine(result["engine"])
+        return result
+
+    async def _extract_full_uncached(self, upload: StoredUpload):
+        if upload.extension != 'pdf' or self.MAX_WORKERS < 2:
+            result = await self.extract_document(upload)
+            return result["text"], result["engine"]
+
+        total = min(await self._run_in_pool(upload.filename, count_pdf_pages_file, upload.path), self.MAX_PAGES)
+        if total < self.PARALLEL_MIN_PAGES:
+            result = await self.extract_document(upload)
+            return result["text"], result["engine"]
+
+        self.jobs += 1
+        step = -(-total // self.MAX_WORKERS)
+        ranges = [(start, min(start + step, total)) for start in range(0, total, step)]
+        results = await asyncio.gather(
+            *(self._run_in_pool(upload.filename, extract_document_file, upload.path, upload.filename,
+                                None, None, page_range)
+              for page_range in ranges),
+            return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0] if isinstance(errors[0], ValueError) else ValueError(f"File processing failed: {errors[0]}")
+        engine = results[0]["engine"]
+        self._count_engine(engine)
+        text = "\n\n".join(r["text"] for r in results if r["text"])
+        if not text.strip():
+            raise ValueError("Empty PDF or scanned image. Please use a text-based PDF.")
+        return text, engine
+
+    def _count_engine(self, engine: str):
+        self.engines[engine] = self.engines.get(engine, 0) + 1
+
+    async def _run_in_pool(self, filename: str, func, *args):
         try:
-            if ext == 'txt':
-                async with await anyio.open_file(filepath, mode='r', encoding='utf-8') as f:
-                    return await f.read()
-            
-            elif ext == 'pdf':
-                # pypdf doesn't natively support async, so we wrap it
-                def _read_pdf():
-                    try:
-                        with open(filepath, 'rb') as f:
-                            pdf = pypdf.PdfReader(f)
-                            text_parts = []
-                            for page in pdf.pages:
-                                extracted = page.extract_text()
-                                if extracted:
-                                    text_parts.append(extracted.strip())
-                            
-                            full_text = "\n\n".join(text_parts)
-                            return full_text if full_text.strip() else "Error: Empty PDF or scanned image. Please use a text-based PDF."
-                    except Exception as pdf_err:
-                        return f"Error reading PDF: {str(pdf_err)}"
-                
-                return await anyio.to_thread.run_sync(_read_pdf)
-
-            elif ext in ['docx', 'doc']:
-                # docx2txt is also sync
-                return await anyio.to_thread.run_sync(lambda: docx2txt.process(filepath))
-            
-            else:
-                return f"Error: Unsupported file type: {ext}"
-        
-        except Exception as e:
-            return f"Error reading file: {str(e)}"
-        
-        return "Error: Unknown failure during extraction"
+            return await self._pool.run(func, *args)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f"⚠️ Extraction of {filename} exceeded {self.JOB_TIMEOUT}s, recycled worker pool")
+            raise ValueError(f"File took too long to process (over {self.JOB_TIMEOUT:.0f}s). Try a smaller file.")
+        except BrokenProcessPool:
+            self.failures += 1
+            raise ValueError("File processing failed. Please try again.")
+        except ValueError:
+            self.failures += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "jobs": self.jobs,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "pool_restarts": self._pool.restarts,
+            "pool_resubmits": self._pool.resubmitted,
+            "engines": dict(self.engines),
+            "cache_hits": self.cache_hits,
+            "cache": self._text_cache.stats()["sqlite"],
+        }
+
+    async def close(self):
+        self._pool.close()
+        await self._text_cache.close()
 
 file_service = FileService()
@@ -0,0 +1,293 @@
+import asyncio
+import json
+import os
+import secrets
+import sqlite3
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from services.rate_limiter import backoff_delay
+from utils.sqlite_store import SQLiteStore
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+CleanupHook = Callable[[Dict[str, Any]], None]
+
+
+class JobQueue(SQLiteStore):
+    """Persistent background job queue backed by SQLite.
+
+    submit() stores a job and returns its id at once; `concurrency` worker
+    tasks claim queued jobs and run the handler registered for their kind.
+    A handler returns a JSON-serialisable result. Failed jobs are retried
+    with jittered backoff up to MAX_ATTEMPTS times, except for
+    NON_RETRYABLE errors (bad input such as an unsupported file), which
+    fail at once.
+    Finished jobs are kept for RESULT_TTL seconds, then deleted. Jobs left
+    running by a process that died are re-queued once they are older than
+    JOB_TIMEOUT. Every job gets a random access token when it is submitted;
+    get() only returns a job to a caller presenting that token, so jobs of
+    users sharing an account (all guests) stay private.
+
+    Claiming happens inside an IMMEDIATE transaction, so several server
+    processes can share one jobs database.
+    """
+
+    MAX_ATTEMPTS = 3
+    NON_RETRYABLE = (ValueError,)  # deterministic input errors; includes pydantic validation
+    RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))  # seconds
+    JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", "300"))  # seconds per attempt
+    POLL_INTERVAL = 1.0  # seconds between checks when idle
+    PURGE_INTERVAL = 60  # seconds between expired-job sweeps
+    ISOLATION_LEVEL = None  # transactions are explicit (BEGIN IMMEDIATE when claiming)
+
+    def __init__(self, db_path: str = "jobs.db", concurrency: Optional[int] = None):
+        super().__init__(db_path, "job-queue")
+        self.concurrency = concurrency or int(os.getenv("JOB_WORKERS", "2"))
+        self._handlers: Dict[str, Tuple[JobHandler, Optional[CleanupHook]]] = {}
+        self._workers = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_purge = 0.0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+
+    def register(self, kind: str, handler: JobHandler, cleanup: Optional[CleanupHook] = None):
+        """Run `handler(payload)` for jobs of this kind; `cleanup(payload)` once a job is finished."""
+        self._handlers[kind] = (handler, cleanup)
+
+    # --- storage (runs on the queue thread) ---
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT,
+                owner TEXT,
+                token TEXT,
+                status TEXT,
+                payload TEXT,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER DEFAULT 0,
+                not_before REAL DEFAULT 0,
+                created_at REAL,
+                updated_at REAL,
+                expires_at REAL
+            )
+        ''')
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+        if 'token' not in columns:
+            # Databases created before jobs had access tokens
+            conn.execute('ALTER TABLE jobs ADD COLUMN token TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, not_before)')
+
+    def _insert_sync(self, job_id: str, kind: str, payload: str, owner: Optional[str], token: str):
+        now = time.time()
+        self._connect().execute(
+            'INSERT INTO jobs (id, kind, owner, token, status, payload, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, owner, token, QUEUED, payload, now, now)
+        )
+
+    def _claim_sync(self) -> Optional[Tuple[str, str, str, int]]:
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT id, kind, payload, attempts FROM jobs WHERE status = ? AND not_before <= ? '
+                'ORDER BY created_at LIMIT 1',
+                (QUEUED, now)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    'UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                    (RUNNING, now, row[0])
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return (row[0], row[1], row[2], row[3] + 1) if row else None
+
+    def _finish_sync(self, job_id: str, status: str, result: Optional[str], error: Optional[str],
+                     retry_at: Optional[float]):
+        now = time.time()
+        if retry_at is not None:
+            self._connect().execute(
+                'UPDATE jobs SET status = ?, error = ?, not_before = ?, updated_at = ? WHERE id = ?',
+                (QUEUED, error, retry_at, now, job_id)
+            )
+            return
+        self._connect().execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, expires_at = ? WHERE id = ?',
+            (status, result, error, now, now + self.RESULT_TTL, job_id)
+        )
+
+    def _requeue_stale_sync(self) -> int:
+        # A running job older than its timeout belongs to a process that died
+        cutoff = time.time() - self.JOB_TIMEOUT - self.POLL_INTERVAL * 30
+        return self._connect().execute(
+            'UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?',
+            (QUEUED, time.time(), RUNNING, cutoff)
+        ).rowcount
+
+    def _purge_sync(self) -> int:
+        return self._connect().execute(
+            'DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?', (time.time(),)
+        ).rowcount
+
+    def _get_sync(self, job_id: str):
+        return self._connect().execute(
+            'SELECT id, kind, token, status, result, error, attempts, created_at, updated_at, expires_at '
+            'FROM jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+
+    def _counts_sync(self) -> Dict[str, int]:
+        return dict(self._connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+    # --- public API ---
+
+    async def submit(self, kind: str, payload: Dict[str, Any], owner: Optional[str] = None) -> Tuple[str, str]:
+        """Queue a job and return its (job_id, access token)."""
+        if kind not in self._handlers:
+            raise Exception(f"No handler registered for job kind '{kind}'")
+        job_id = uuid.uuid4().hex
+        token = secrets.token_urlsafe(16)
+        await self._run(self._insert_sync, job_id, kind, json.dumps(payload), owner, token)
+        self.submitted += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id, token
+
+    async def get(self, job_id: str, token: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """A job's status and result; None if it does not exist or token is not its access token.
+
+        Pass token=None only for internal lookups.
+        """
+        row = await self._run(self._get_sync, job_id)
+        if row is None:
+            return None
+        job_id, kind, job_token, status, result, error, attempts, created_at, updated_at, expires_at = row
+        if token is not None and not secrets.compare_digest(job_token or "", token):
+            return None
+        info = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "attempts": attempts,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "expires_at": expires_at,
+        }
+        if status == SUCCEEDED:
+            info["result"] = json.loads(result) if result else None
+        if error:
+            info["error"] = error
+        return info
+
+    async def start(self):
+        """Start the worker tasks."""
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.concurrency)]
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                await self._maybe_purge()
+                job = await self._run(self._claim_sync)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._execute(*job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job worker {index} error: {e}")
+                await asyncio.sleep(self.POLL_INTERVAL)
+
+    async def _execute(self, job_id: str, kind: str, payload_json: str, attempt: int):
+        payload = json.loads(payload_json)
+        handler, cleanup = self._handlers.get(kind, (None, None))
+        try:
+            if handler is None:
+                raise Exception(f"No handler registered for job kind '{kind}'")
+            outcome = await asyncio.wait_for(handler(payload), timeout=self.JOB_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            retryable = handler is not None and not isinstance(e, self.NON_RETRYABLE)
+            if retryable and attempt < self.MAX_ATTEMPTS:
+                self.retried += 1
+                delay = backoff_delay(attempt, base=2.0, cap=60.0)
+                print(f"⚠️ Job {job_id} ({kind}) attempt {attempt} failed, retrying in {delay:.1f}s: {error}")
+                await self._run(self._finish_sync, job_id, QUEUED, None, error, time.time() + delay)
+                return
+            print(f"❌ Job {job_id} ({kind}) failed: {error}")
+            self.failed += 1
+            await self._run(self._finish_sync, job_id, FAILED, None, error, None)
+            self._cleanup(cleanup, payload)
+            return
+
+        await self._run(self._finish_sync, job_id, SUCCEEDED, json.dumps(outcome), None, None)
+        self.succeeded += 1
+        self._cleanup(cleanup, payload)
+
+    @staticmethod
+    def _cleanup(cleanup: Optional[CleanupHook], payload: Dict[str, Any]):
+        if cleanup is None:
+            return
+        try:
+            cleanup(payload)
+        except Exception as e:
+            print(f"Job cleanup error: {e}")
+
+    async def _maybe_purge(self):
+        if time.monotonic() - self._last_purge < self.PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        purged = await self._run(self._purge_sync)
+        if purged:
+            print(f"🧹 Removed {purged} expired jobs")
+        requeued = await self._run(self._requeue_stale_sync)
+        if requeued:
+            print(f"🔁 Re-queued {requeued} interrupted jobs")
+
+    async def stats(self) -> Dict[str, Any]:
+        try:
+            counts = await self._run(self._counts_sync)
+        except Exception as e:
+            print(f"Job queue stats error: {e}")
+            counts = {}
+        return {
+            "workers": len(self._workers),
+            "by_status": counts,
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+        }
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await super().close()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,127 @@
+import time
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker plus EWMA latency and error rate.
+
+    After failure_threshold consecutive failures the breaker opens for
+    cooldown seconds. It then goes half-open and admits at most
+    half_open_probes concurrent probe calls. The first successful probe
+    closes it again; a failed probe re-opens it.
+
+    score() is 0 for a healthy provider, so providers keep their static
+    priority order (which encodes output quality). It only rises for a
+    recent error rate above ERROR_DEMOTE or for latency over SLOW_FACTOR
+    times the provider's own baseline, which is a slow EWMA. Gemini
+    being slower than Cloudflare is therefore not a reason to demote it,
+    but Gemini being twice as slow as it usually is, is.
+    """
+
+    ERROR_DEMOTE = 0.3  # error-rate EWMA that demotes a provider (about two recent failures)
+    SLOW_FACTOR = 2.0  # latency vs. own baseline that demotes a provider
+    BASELINE_ALPHA = 0.02  # smoothing for the long-run latency baseline
+    BASELINE_MIN_SAMPLES = 5  # successes needed before latency can demote
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 30,
+                 half_open_probes: int = 1, alpha: float = 0.2):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.alpha = alpha
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+        self.error_ewma = 0.0
+        self.successes = 0
+        self.failures = 0
+
+    def _maybe_half_open(self):
+        if self.state == OPEN and time.monotonic() >= self.opened_at + self.cooldown:
+            self.state = HALF_OPEN
+            self.probes_in_flight = 0
+            print(f"🔌 {self.name} circuit half-open, probing")
+
+    def is_available(self) -> bool:
+        """Whether a call could be admitted right now (does not reserve a probe)."""
+        self._maybe_half_open()
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN:
+            return self.probes_in_flight < self.half_open_probes
+        return False
+
+    def allow_request(self) -> bool:
+        """Admit a call, reserving a probe slot when half-open."""
+        if not self.is_available():
+            return False
+        if self.state == HALF_OPEN:
+            self.probes_in_flight += 1
+        return True
+
+    def release(self):
+        """Give back a probe slot for a call that ended without a verdict."""
+        if self.state == HALF_OPEN and self.probes_in_flight > 0:
+            self.probes_in_flight -= 1
+
+    def record_success(self, latency: float):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.latency_ewma = latency if self.latency_ewma is None else (
+            self.alpha * latency + (1 - self.alpha) * self.latency_ewma)
+        self.baseline_latency = latency if self.baseline_latency is None else (
+            self.BASELINE_ALPHA * latency + (1 - self.BASELINE_ALPHA) * self.baseline_latency)
+        self.error_ewma = (1 - self.alpha) * self.error_ewma
+        if self.state != CLOSED:
+            print(f"✅ {self.name} circuit closed")
+        self.state = CLOSED
+        self.probes_in_flight = 0
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.error_ewma = self.alpha + (1 - self.alpha) * self.error_ewma
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                print(f"⚠️ {self.name} circuit open for {self.cooldown}s after {self.consecutive_failures} failures")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self.probes_in_flight = 0
+
+    def slowdown(self) -> float:
+        """Recent latency relative to this provider's own baseline (1.0 = normal)."""
+        if self.successes < self.BASELINE_MIN_SAMPLES or not self.baseline_latency:
+            return 1.0
+        return self.latency_ewma / self.baseline_latency
+
+    def score(self) -> float:
+        """Demotion score, lower is better; 0 while the provider is healthy."""
+        score = 0.0
+        if self.error_ewma >= self.ERROR_DEMOTE:
+            score += self.error_ewma
+        slowdown = self.slowdown()
+        if slowdown >= self.SLOW_FACTOR:
+            score += slowdown - 1
+        return score
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._maybe_half_open()
+        return {
+            "state": self.state,
+            "score": round(self.score(), 3),
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "baseline_latency": round(self.baseline_latency, 3) if self.baseline_latency is not None else None,
+            "error_rate_ewma": round(self.error_ewma, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retry_in": round(max(0.0, self.opened_at + self.cooldown - time.monotonic()), 1) if self.state == OPEN else 0,
+        }
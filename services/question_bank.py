@@ -0,0 +1,207 @@
+import hashlib
+import json
+import re
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.sqlite_store import SQLiteStore
+
+MODE_TYPES = {
+    "single_only": "single",
+    "multi_only": "multi",
+    "truefalse_only": "truefalse",
+}
+
+
+def type_distribution(mode: str, count: int) -> Dict[str, int]:
+    """How many questions of each type a quiz of `count` questions needs."""
+    if mode in MODE_TYPES:
+        return {MODE_TYPES[mode]: count}
+    # Mixed mode: the 40/40/20 split every mixed prompt asks the model for,
+    # never more than `count` in total (true/false gets the remainder)
+    num_single = min(count, max(1, int(count * 0.4)))
+    num_multi = min(count - num_single, max(1, int(count * 0.4)))
+    num_tf = max(0, count - num_single - num_multi)
+    return {"single": num_single, "multi": num_multi, "truefalse": num_tf}
+
+
+def shortfall_split(mode: str, count: int, banked: List[Dict[str, Any]]) -> Tuple[str, Dict[str, int]]:
+    """Mode and per-type counts for what `banked` leaves missing from a `count`-question quiz.
+
+    In mixed mode the split only asks for the types the banked questions
+    lack; if just one type is missing, its single-type mode is returned.
+    """
+    split = type_distribution(mode, count)
+    for q in banked:
+        if split.get(q.get("type"), 0) > 0:
+            split[q["type"]] -= 1
+    needed = max(0, count - len(banked))
+    # Banked questions over their type's quota still count toward the total
+    while sum(split.values()) > needed:
+        largest = max(split, key=split.get)
+        split[largest] -= 1
+    split = {qtype: n for qtype, n in split.items() if n > 0}
+    if mode not in MODE_TYPES and len(split) == 1:
+        mode = next(m for m, qtype in MODE_TYPES.items() if qtype in split)
+    return mode, split
+
+
+def _norm(value: Optional[str]) -> str:
+    return ' '.join((value or '').split()).casefold()
+
+
+def merge_questions(base: List[Dict[str, Any]], extra: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Append questions from extra whose prompt text is not already in base."""
+    seen = {_norm(q.get("prompt")) for q in base}
+    merged = list(base)
+    for q in extra:
+        key = _norm(q.get("prompt"))
+        if key not in seen:
+            seen.add(key)
+            merged.append(q)
+    return merged
+
+
+def _prompt_tokens(value: Optional[str]) -> set:
+    return set(re.findall(r"\w+", _norm(value)))
+
+
+def remove_near_duplicates(questions: List[Dict[str, Any]], threshold: float = 0.8) -> List[Dict[str, Any]]:
+    """Drop questions whose prompt shares >= threshold of its words (Jaccard) with an earlier one."""
+    kept, kept_tokens = [], []
+    for q in questions:
+        tokens = _prompt_tokens(q.get("prompt"))
+        if any(tokens and len(tokens & other) / len(tokens | other) >= threshold for other in kept_tokens):
+            continue
+        kept.append(q)
+        kept_tokens.append(tokens)
+    return kept
+
+
+class QuestionBank(SQLiteStore):
+    """Persistent store of individual validated quiz questions.
+
+    Questions are indexed by normalized topic, language, difficulty, type and
+    mastery level, so requests of any size can be assembled from questions
+    generated by earlier requests. Per-user "seen" rows let signed-in users
+    get questions they have not answered before.
+    """
+
+    def __init__(self, db_path: str = "question_bank.db"):
+        super().__init__(db_path, "question-bank")
+        self.served = 0
+        self.requested = 0
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS question_bank (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                fingerprint TEXT UNIQUE,
+                topic TEXT,
+                language TEXT,
+                difficulty TEXT,
+                qtype TEXT,
+                mastery_level TEXT,
+                payload TEXT,
+                created_at TIMESTAMP
+            )
+        ''')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bank_lookup
+            ON question_bank(topic, language, difficulty, mastery_level, qtype)
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS question_seen (
+                user_key TEXT,
+                question_id INTEGER,
+                PRIMARY KEY (user_key, question_id)
+            )
+        ''')
+        conn.commit()
+
+    def _add_sync(self, questions: List[Dict[str, Any]], topic: str, language: str,
+                  difficulty: str, mastery_level: str, seen_by: Optional[str]) -> int:
+        conn = self._connect()
+        ids = []
+        for q in questions:
+            qtype = q.get("type", "single")
+            fingerprint = hashlib.sha1(
+                f"{topic}|{language}|{qtype}|{_norm(q.get('prompt'))}".encode()
+            ).hexdigest()
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO question_bank
+                (fingerprint, topic, language, difficulty, qtype, mastery_level, payload, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (fingerprint, topic, language, difficulty, qtype, mastery_level,
+                  json.dumps(q, ensure_ascii=False), datetime.now()))
+            if cursor.rowcount:
+                ids.append(cursor.lastrowid)
+            else:
+                ids.append(conn.execute(
+                    'SELECT id FROM question_bank WHERE fingerprint = ?', (fingerprint,)
+                ).fetchone()[0])
+        if seen_by:
+            conn.executemany(
+                'INSERT OR IGNORE INTO question_seen (user_key, question_id) VALUES (?, ?)',
+                [(seen_by, qid) for qid in ids]
+            )
+        conn.commit()
+        return len(ids)
+
+    def _sample_sync(self, topic: str, language: str, difficulty: str, mastery_level: str,
+                     wanted: Dict[str, int], user_key: Optional[str]) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        picked = []
+        for qtype, count in wanted.items():
+            if count <= 0:
+                continue
+            rows = conn.execute('''
+                SELECT id, payload FROM question_bank
+                WHERE topic = ? AND language = ? AND difficulty = ? AND mastery_level = ? AND qtype = ?
+                  AND (? IS NULL OR id NOT IN (SELECT question_id FROM question_seen WHERE user_key = ?))
+                ORDER BY RANDOM() LIMIT ?
+            ''', (topic, language, difficulty, mastery_level, qtype, user_key, user_key, count)).fetchall()
+            picked.extend(rows)
+        if user_key and picked:
+            conn.executemany(
+                'INSERT OR IGNORE INTO question_seen (user_key, question_id) VALUES (?, ?)',
+                [(user_key, qid) for qid, _ in picked]
+            )
+            conn.commit()
+        return [json.loads(payload) for _, payload in picked]
+
+    async def add(self, questions: List[Dict[str, Any]], topic: str, language: str, difficulty: str,
+                  mastery_level: str = "", seen_by: Optional[str] = None) -> int:
+        """Store validated questions (duplicates by prompt text are ignored)."""
+        if not questions:
+            return 0
+        try:
+            return await self._run(self._add_sync, questions, _norm(topic), _norm(language),
+                                   _norm(difficulty), _norm(mastery_level), seen_by)
+        except Exception as e:
+            print(f"Question bank write error: {e}")
+            return 0
+
+    async def sample(self, topic: str, language: str, difficulty: str, mode: str, count: int,
+                     mastery_level: str = "", user_key: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return up to `count` stored questions matching the request.
+
+        With a user_key, only questions that user has not seen are returned
+        and they are marked as seen.
+        """
+        self.requested += count
+        try:
+            questions = await self._run(self._sample_sync, _norm(topic), _norm(language), _norm(difficulty),
+                                        _norm(mastery_level), type_distribution(mode, count), user_key)
+        except Exception as e:
+            print(f"Question bank read error: {e}")
+            return []
+        self.served += len(questions)
+        return questions
+
+    def stats(self) -> Dict[str, int]:
+        return {"requested": self.requested, "served": self.served}
+
+
+question_bank = QuestionBank()
@@ -0,0 +1,120 @@
+import asyncio
+import random
+import re
+import time
+from typing import Dict, Optional
+
+
+class ProviderRateLimited(Exception):
+    """A provider answered 429/503; retry_after is its wait hint in seconds, if any."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds (HTTP-date values are ignored)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def parse_retry_hint(text: str) -> Optional[float]:
+    """Find a wait hint in a provider error body.
+
+    Handles HuggingFace's ``"estimated_time": 20.0`` and Gemini's
+    ``retry_delay { seconds: 12 }`` / ``Please retry in 12.3s`` messages.
+    """
+    for pattern in (r'"?estimated_time"?\s*:\s*([\d.]+)',
+                    r'retry_delay\s*\{\s*seconds:\s*(\d+)',
+                    r'retry in\s*([\d.]+)\s*s'):
+        match = re.search(pattern, text or "", re.IGNORECASE)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None, base: float = 0.5, cap: float = 8.0) -> float:
+    """Full-jitter exponential backoff, never shorter than the provider's hint."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    return max(delay, retry_after or 0.0)
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations, allowing a negative balance.
+
+    reserve() returns how long the caller must wait for its reservation to
+    be covered, so callers can decide to wait or go elsewhere.
+    """
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        self._refill()
+        deficit = amount - self.level
+        return max(0.0, deficit / self.refill_per_second) if deficit > 0 else 0.0
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+
+class ProviderRateLimiter:
+    """Requests-per-minute and tokens-per-minute limits for one provider."""
+
+    def __init__(self, name: str, rpm: float, tpm: float):
+        self.name = name
+        self.requests = TokenBucket(rpm, rpm / 60.0)
+        self.tokens = TokenBucket(tpm, tpm / 60.0)
+        self.blocked_until = 0.0
+        self.waited = 0
+        self.rejected = 0
+        self.throttled = 0
+
+    def estimate_wait(self, tokens: int) -> float:
+        blocked = max(0.0, self.blocked_until - time.monotonic())
+        return max(blocked, self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    async def acquire(self, tokens: int, max_wait: float) -> bool:
+        """Reserve capacity for one call, waiting up to max_wait seconds.
+
+        Returns False (reserving nothing) when the wait would be longer, so
+        the caller can reroute to another provider instead of queueing.
+        """
+        wait = self.estimate_wait(tokens)
+        if wait > max_wait:
+            self.rejected += 1
+            return False
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        if wait > 0:
+            self.waited += 1
+            await asyncio.sleep(wait)
+        return True
+
+    def defer(self, seconds: Optional[float]):
+        """Respect a provider's Retry-After / estimated-wait hint."""
+        self.throttled += 1
+        if seconds:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "throttled": self.throttled,
+            "blocked_for": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+        }
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from utils.presentation_render import precompile_templates, render_document
+from utils.process_pool import WorkerPool
+
+
+class RenderService:
+    """Renders notes and slide decks (pdf/docx/pptx) off the event loop.
+
+    The renderers are CPU-bound pure Python, so they run in a small spawn
+    process pool and hand back the document bytes; nothing touches disk.
+    At most MAX_CONCURRENT renders are submitted at once and the rest wait
+    on a semaphore, so a burst of decks queues up instead of piling work on
+    the pool. A render that runs over RENDER_TIMEOUT seconds is abandoned
+    and the pool is recycled. Each worker builds the themed base templates
+    once when it starts.
+    """
+
+    MAX_WORKERS = int(os.getenv("RENDER_WORKERS", str(min(2, os.cpu_count() or 1))))
+    MAX_CONCURRENT = int(os.getenv("RENDER_CONCURRENCY", str(MAX_WORKERS)))
+    RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "60"))  # seconds
+
+    def __init__(self):
+        self._pool = WorkerPool(self.MAX_WORKERS, self.RENDER_TIMEOUT, initializer=precompile_templates)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.active = 0
+        self.peak_waiting = 0
+        self.renders = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.total_wait = 0.0
+        self.total_render = 0.0
+        self.by_format: Dict[str, int] = {}
+
+    async def render(self, fmt: str, content: Dict[str, Any], options: Dict[str, Any]) -> bytes:
+        """Render a document in a worker process and return its bytes."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENT)
+
+        queued_at = time.monotonic()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started = time.monotonic()
+        self.total_wait += started - queued_at
+        self.active += 1
+        try:
+            data = await self._run_in_pool(fmt, content, options)
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+        self.renders += 1
+        self.total_render += time.monotonic() - started
+        self.by_format[fmt] = self.by_format.get(fmt, 0) + 1
+        return data
+
+    async def _run_in_pool(self, fmt: str, content: Dict[str, Any], options: Dict[str, Any]) -> bytes:
+        try:
+            return await self._pool.run(render_document, fmt, content, options)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            print(f"⚠️ Rendering {fmt} exceeded {self.RENDER_TIMEOUT}s, recycled render pool")
+            raise Exception(f"Rendering took too long (over {self.RENDER_TIMEOUT:.0f}s)")
+        except BrokenProcessPool:
+            self.failures += 1
+            raise Exception("Rendering failed. Please try again.")
+        except Exception:
+            self.failures += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.MAX_WORKERS,
+            "max_concurrent": self.MAX_CONCURRENT,
+            "active": self.active,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "renders": self.renders,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "pool_restarts": self._pool.restarts,
+            "pool_resubmits": self._pool.resubmitted,
+            "avg_wait_ms": round(1000 * self.total_wait / self.renders, 1) if self.renders else 0,
+            "avg_render_ms": round(1000 * self.total_render / self.renders, 1) if self.renders else 0,
+            "by_format": dict(self.by_format),
+        }
+
+    async def close(self):
+        self._pool.close()
+
+
+render_service = RenderService()
@@ -0,0 +1,96 @@
+import hashlib
+import os
+import tempfile
+from typing import Optional
+
+import anyio
+from fastapi import UploadFile
+
+
+class UploadTooLarge(ValueError):
+    """The upload is bigger than the allowed size."""
+
+
+class StoredUpload:
+    """An upload streamed to a private temp file, with its size and SHA-256."""
+
+    def __init__(self, filename: str, path: str, size: int, sha256: str):
+        self.filename = filename
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+    @property
+    def extension(self) -> str:
+        return self.filename.split('.')[-1].lower()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class UploadService:
+    """Shared ingestion for file uploads.
+
+    Uploads are copied in CHUNK_SIZE pieces with async file I/O to a unique
+    temp file (never to a path built from the client's file name). The size
+    limit is enforced while copying, and the SHA-256 is computed on the way
+    through, so callers can deduplicate work on identical files. Callers
+    must remove() the StoredUpload when done.
+    """
+
+    CHUNK_SIZE = 1024 * 1024  # 1 MB
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024
+    TEMP_DIR = os.path.join("uploads", "tmp")
+
+    def __init__(self):
+        self.ingested = 0
+        self.rejected = 0
+        self.bytes_ingested = 0
+
+    async def ingest(self, file: UploadFile, max_bytes: Optional[int] = None) -> StoredUpload:
+        limit = max_bytes or self.MAX_UPLOAD_BYTES
+        filename = os.path.basename(file.filename or "upload")
+        # Fail fast when the client declared a size
+        if getattr(file, "size", None) and file.size > limit:
+            self.rejected += 1
+            raise UploadTooLarge(self._too_large_message(limit))
+
+        os.makedirs(self.TEMP_DIR, exist_ok=True)
+        suffix = os.path.splitext(filename)[1].lower()[:10]
+        fd, path = tempfile.mkstemp(dir=self.TEMP_DIR, suffix=suffix)
+        os.close(fd)
+
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            async with await anyio.open_file(path, "wb") as out:
+                while True:
+                    chunk = await file.read(self.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > limit:
+                        self.rejected += 1
+                        raise UploadTooLarge(self._too_large_message(limit))
+                    digest.update(chunk)
+                    await out.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+
+        self.ingested += 1
+        self.bytes_ingested += size
+        return StoredUpload(filename, path, size, digest.hexdigest())
+
+    @staticmethod
+    def _too_large_message(limit: int) -> str:
+        return f"File is too large. The maximum upload size is {limit // (1024 * 1024)} MB."
+
+    def stats(self):
+        return {"ingested": self.ingested, "rejected": self.rejected, "bytes": self.bytes_ingested}
+
+
+upload_service = UploadService()
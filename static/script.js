@@ -988,12 +988,34 @@ const app = {
                 throw new Error(detail);
             }
 
-            const disposition = res.headers.get('content-disposition') || '';
-            const match = disposition.match(/filename="?([^";]+)"?/i);
             const fallbackName = `${topic.replace(/\s+/g, '_')}_Notes.${format}`;
-            const filename = match ? match[1] : fallbackName;
+            let fileRes = res;
+            let filename = fallbackName;
+            if (res.status === 202) {
+                // Rendering runs as a background job: poll until it finishes
+                const job = await res.json();
+                let status = job;
+                const deadline = Date.now() + 5 * 60 * 1000;
+                while (status.status === 'queued' || status.status === 'running') {
+                    if (Date.now() > deadline) throw new Error('Creating notes is taking too long. Please try again.');
+                    await new Promise(resolve => setTimeout(resolve, 1500));
+                    const statusRes = await fetch(`${API_BASE_URL}${job.status_url}`);
+                    if (!statusRes.ok) throw new Error('Failed to create notes');
+                    status = await statusRes.json();
+                }
+                if (status.status !== 'succeeded') throw new Error(status.error || 'Failed to create notes');
+
+                filename = status.result.filename || fallbackName;
+                fileRes = await fetch(`${API_BASE_URL}${status.result.download_url}`);
+                if (!fileRes.ok) throw new Error('Failed to download notes');
+            } else {
+                // Previously rendered: the file comes back directly
+                const disposition = res.headers.get('content-disposition') || '';
+                const match = disposition.match(/filename\*=UTF-8''([^;]+)/i);
+                if (match) filename = decodeURIComponent(match[1]);
+            }
 
-            const blob = await res.blob();
+            const blob = await fileRes.blob();
             const url = window.URL.createObjectURL(blob);
             const link = document.createElement('a');
             link.href = url;
@@ -1045,7 +1067,7 @@ const app = {
         historyContainer.scrollTop = historyContainer.scrollHeight;
 
         try {
-            const res = await fetch(`${API_BASE_URL}/ai/chat`, {
+            const res = await fetch(`${API_BASE_URL}/ai/chat/stream`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
@@ -1056,22 +1078,44 @@ const app = {
                 })
             });
 
-            if (!res.ok) throw new Error("AI didn't respond");
-            const data = await res.json();
-
-            // Remove loading
-            loadingMsg.remove();
+            if (!res.ok || !res.body) throw new Error("AI didn't respond");
 
-            // Add Bot Message
+            // Add Bot Message (filled in as tokens arrive)
             const botMsg = document.createElement('div');
             botMsg.className = 'msg bot';
             botMsg.style.cssText = `background: rgba(255,255,255,0.1); padding: 10px 15px; border-radius: 12px 12px 12px 0; max-width: 80%; margin: 5px 0;`;
             // Simple markdown parsing for bold
-            botMsg.innerHTML = data.response.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>').replace(/\n/g, '<br>');
-            historyContainer.appendChild(botMsg);
-            historyContainer.scrollTop = historyContainer.scrollHeight;
+            const render = (text) => text.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>').replace(/\n/g, '<br>');
+
+            // Read Server-Sent Events: "data: {delta}" frames, then "event: done"
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let fullText = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const evt of events) {
+                    if (evt.startsWith('event: error')) throw new Error("AI didn't respond");
+                    if (!evt.startsWith('data: ')) continue;
+                    const payload = JSON.parse(evt.slice(6));
+                    if (payload.delta === undefined) continue;
+                    if (!fullText) {
+                        // Remove loading on first token
+                        loadingMsg.remove();
+                        historyContainer.appendChild(botMsg);
+                    }
+                    fullText += payload.delta;
+                    botMsg.innerHTML = render(fullText);
+                    historyContainer.scrollTop = historyContainer.scrollHeight;
+                }
+            }
 
-            app.tutorHistory.push({ role: 'assistant', content: data.response });
+            if (!fullText) throw new Error("AI didn't respond");
+            app.tutorHistory.push({ role: 'assistant', content: fullText });
 
         } catch (err) {
             loadingMsg.textContent = "Error: " + err.message;
@@ -0,0 +1,35 @@
+import asyncio
+
+from services.artifact_cache import ArtifactCache, artifact_key
+
+DECK = {"slides": [{"title": "Cells", "content": ["Nucleus", "Membrane"], "visual_cue": "microscope"}]}
+OPTIONS = {"topic": "Biology", "theme": "Modern", "font_style": "Sans"}
+
+
+def test_key_ignores_whitespace_and_unrendered_fields():
+    reformatted = {"slides": [{"title": " Cells ", "content": ["Nucleus", "Membrane\n"], "layout": "two"}]}
+    assert artifact_key(reformatted, "pptx", OPTIONS) == artifact_key(DECK, "pptx", OPTIONS)
+    assert artifact_key(DECK, "pptx", {**OPTIONS, "color_palette": "Pastel"}) == artifact_key(DECK, "pptx", OPTIONS)
+
+
+def test_key_changes_with_what_is_rendered():
+    key = artifact_key(DECK, "pptx", OPTIONS)
+    assert artifact_key(DECK, "pdf", OPTIONS) != key
+    assert artifact_key(DECK, "pptx", {**OPTIONS, "theme": "Dark"}) != key
+    edited = {"slides": [{"title": "Cells", "content": ["Nucleus"]}]}
+    assert artifact_key(edited, "pptx", OPTIONS) != key
+
+
+def test_least_recently_used_artifacts_are_evicted(tmp_path):
+    async def scenario():
+        cache = ArtifactCache(str(tmp_path / "artifacts"), max_bytes=250)
+        try:
+            await cache.put("a", "pdf", b"a" * 100)
+            await cache.put("b", "pdf", b"b" * 100)
+            await cache.get("a", "pdf")  # "b" is now the least recently used
+            await cache.put("c", "pdf", b"c" * 100)
+            return [await cache.get(key, "pdf") is not None for key in "abc"], cache.evictions
+        finally:
+            await cache.close()
+
+    assert asyncio.run(scenario()) == ([True, False, True], 1)
@@ -0,0 +1,60 @@
+import asyncio
+
+from services.cache_service import SQLiteCacheBackend, compress_payload, decompress_payload
+
+
+def test_payload_compression_round_trips():
+    short, long = "tiny", "question " * 200
+    assert compress_payload(short) == short
+    stored = compress_payload(long)
+    assert isinstance(stored, bytes) and len(stored) < len(long)
+    assert decompress_payload(stored) == long
+
+
+def test_eviction_trims_to_low_water_keeping_used_entries(tmp_path):
+    async def scenario():
+        cache = SQLiteCacheBackend(str(tmp_path / "cache.db"), max_bytes=2000)
+        try:
+            await cache.set("hot", "p", "x" * 100, "test")
+            await cache.flush()
+            await cache.record_hits({"hot": 5})
+            for i in range(30):
+                await cache.set(f"cold{i}", "p", f"{i}" * 100, "test")
+                await cache.flush()
+            return cache.stats()["sqlite"], await cache.get("hot"), await cache.get("cold29")
+        finally:
+            await cache.close()
+
+    stats, hot, newest = asyncio.run(scenario())
+    assert stats["evictions"] > 0
+    assert stats["bytes"] <= 2000
+    assert hot is not None
+    assert newest is not None
+
+
+def test_failed_flush_is_retried_once_then_counted(tmp_path):
+    async def scenario():
+        cache = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+        cache.WRITE_FLUSH_DELAY = 0.01
+        write = cache._write_batch_sync
+        failures = [1]
+
+        def flaky(batch):
+            if failures[0]:
+                failures[0] -= 1
+                raise RuntimeError("disk I/O error")
+            return write(batch)
+
+        cache._write_batch_sync = flaky
+        try:
+            await cache.set("saved", "p", "kept", "test")
+            await cache.flush()
+            saved = await cache.get("saved")
+            failures[0] = 2
+            await cache.set("lost", "p", "gone", "test")
+            await cache.flush()
+            return saved, await cache.get("lost"), cache.stats()["sqlite"]["dropped_writes"]
+        finally:
+            await cache.close()
+
+    assert asyncio.run(scenario()) == (("kept", "test"), None, 1)
@@ -0,0 +1,52 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Wall-clock budget for `import main_web` in a fresh interpreter
+IMPORT_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "3.0"))  # seconds
+
+# Libraries that must only load on first use, never at startup
+HEAVY_MODULES = ("google.generativeai", "fitz", "docx", "pptx", "reportlab", "fpdf", "pypdf")
+
+# Blank provider keys: a configured Gemini key imports its SDK at startup by
+# design, and load_dotenv never overrides variables that are already set
+NO_PROVIDER_KEYS = {
+    "GEMINI_API_KEY": "",
+    "CLOUDFLARE_API_KEY": "",
+    "CLOUDFLARE_ACCOUNT_ID": "",
+    "HUGGINGFACE_API_KEY": "",
+}
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main_web
+elapsed = time.perf_counter() - started
+print(json.dumps({"elapsed": elapsed, "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def _import_main_web(tmp_path):
+    # Run from a scratch directory so the databases the app creates on
+    # import stay out of the repo; the app only needs static/ next to it
+    (tmp_path / "static").symlink_to(REPO_ROOT / "static", target_is_directory=True)
+    env = dict(os.environ, PYTHONPATH=str(REPO_ROOT), **NO_PROVIDER_KEYS)
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=tmp_path, env=env,
+        capture_output=True, text=True, timeout=120
+    )
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def test_main_web_import_time(tmp_path):
+    result = _import_main_web(tmp_path)
+
+    assert not result["loaded"], f"heavy modules imported at startup: {result['loaded']}"
+    assert result["elapsed"] < IMPORT_BUDGET, (
+        f"importing main_web took {result['elapsed']:.2f}s (budget {IMPORT_BUDGET:.1f}s)"
+    )
@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+import services.job_queue as job_queue_module
+from services.job_queue import FAILED, QUEUED, SUCCEEDED, JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    # Retry immediately instead of after seconds of backoff
+    monkeypatch.setattr(job_queue_module, "backoff_delay", lambda *args, **kwargs: 0)
+    queue = JobQueue(str(tmp_path / "jobs.db"), concurrency=1)
+    queue.POLL_INTERVAL = 0.02
+    return queue
+
+
+async def _wait_until_done(queue, job_id, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while asyncio.get_running_loop().time() < deadline:
+        job = await queue.get(job_id)
+        if job["status"] in (SUCCEEDED, FAILED):
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def _run(queue, scenario):
+    async def main():
+        await queue.start()
+        try:
+            return await scenario()
+        finally:
+            await queue.close()
+    return asyncio.run(main())
+
+
+def test_job_result_needs_its_token(queue):
+    async def handler(payload):
+        return {"doubled": payload["n"] * 2}
+    queue.register("double", handler)
+
+    async def scenario():
+        job_id, token = await queue.submit("double", {"n": 21}, owner="9999")
+        await _wait_until_done(queue, job_id)
+        return await queue.get(job_id, token), await queue.get(job_id, "not-the-token")
+
+    mine, other = _run(queue, scenario)
+    assert mine["status"] == SUCCEEDED
+    assert mine["result"] == {"doubled": 42}
+    assert other is None
+
+
+def test_failed_jobs_are_retried_then_succeed(queue):
+    attempts = []
+
+    async def flaky(payload):
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("provider hiccup")
+        return "ok"
+    queue.register("flaky", flaky)
+
+    async def scenario():
+        job_id, _ = await queue.submit("flaky", {})
+        return await _wait_until_done(queue, job_id)
+
+    job = _run(queue, scenario)
+    assert job["status"] == SUCCEEDED
+    assert job["attempts"] == 3
+    assert queue.retried == 2
+
+
+def test_retries_stop_at_max_attempts(queue):
+    async def broken(payload):
+        raise RuntimeError("still down")
+    queue.register("broken", broken)
+
+    async def scenario():
+        job_id, _ = await queue.submit("broken", {})
+        return await _wait_until_done(queue, job_id)
+
+    job = _run(queue, scenario)
+    assert job["status"] == FAILED
+    assert job["attempts"] == queue.MAX_ATTEMPTS
+    assert job["error"] == "still down"
+
+
+def test_validation_errors_fail_without_retry(queue):
+    cleaned = []
+
+    async def picky(payload):
+        raise ValueError("unsupported file type")
+    queue.register("picky", picky, cleanup=lambda payload: cleaned.append(payload["path"]))
+
+    async def scenario():
+        job_id, _ = await queue.submit("picky", {"path": "/tmp/upload"})
+        return await _wait_until_done(queue, job_id)
+
+    job = _run(queue, scenario)
+    assert job["status"] == FAILED
+    assert job["attempts"] == 1
+    assert cleaned == ["/tmp/upload"]
+
+
+def test_finished_jobs_expire_after_result_ttl(queue):
+    async def handler(payload):
+        return None
+    queue.register("noop", handler)
+    queue.RESULT_TTL = -1
+
+    async def scenario():
+        job_id, _ = await queue.submit("noop", {})
+        await _wait_until_done(queue, job_id)
+        purged = await queue._run(queue._purge_sync)
+        return purged, await queue.get(job_id)
+
+    assert _run(queue, scenario) == (1, None)
+
+
+def test_interrupted_jobs_are_requeued(queue):
+    queue.register("noop", lambda payload: asyncio.sleep(0))
+    queue.JOB_TIMEOUT = -60  # every running job counts as stale
+
+    async def scenario():
+        job_id, _ = await queue.submit("noop", {})
+        claimed = await queue._run(queue._claim_sync)  # claimed by a process that then died
+        requeued = await queue._run(queue._requeue_stale_sync)
+        return claimed[0] == job_id, requeued, (await queue.get(job_id))["status"]
+
+    async def main():
+        try:
+            return await scenario()
+        finally:
+            await queue.close()
+
+    assert asyncio.run(main()) == (True, 1, QUEUED)
+
+
+def test_submit_rejects_unknown_kinds(queue):
+    async def main():
+        try:
+            await queue.submit("nope", {})
+        finally:
+            await queue.close()
+
+    with pytest.raises(Exception, match="No handler registered"):
+        asyncio.run(main())
@@ -0,0 +1,47 @@
+import pytest
+
+from utils.json_stream import JSONArrayStreamParser
+
+
+def _feed(text, chunk_size):
+    parser = JSONArrayStreamParser()
+    objects = []
+    for i in range(0, len(text), chunk_size):
+        objects.extend(parser.feed(text[i:i + chunk_size]))
+    return objects, parser
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1000])
+def test_objects_are_yielded_regardless_of_chunking(chunk_size):
+    text = '```json\n[\n  {"prompt": "a", "choices": ["x", "y"]},\n  {"prompt": "b", "nested": {"k": [1, 2]}}\n]\n```'
+    objects, parser = _feed(text, chunk_size)
+    assert objects == [{"prompt": "a", "choices": ["x", "y"]}, {"prompt": "b", "nested": {"k": [1, 2]}}]
+    assert parser.failed == 0
+
+
+def test_each_object_is_returned_as_soon_as_it_closes():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"n": 1}, {"n"') == [{"n": 1}]
+    assert parser.feed(': 2}]') == [{"n": 2}]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 1000])
+def test_brackets_in_chatter_do_not_start_the_array(chunk_size):
+    objects, _ = _feed('Here are [5] questions: [{"n": 1}, {"n": 2}]', chunk_size)
+    assert objects == [{"n": 1}, {"n": 2}]
+
+
+def test_brackets_and_quotes_inside_strings():
+    objects, _ = _feed(r'[{"prompt": "is ] a } bracket \"quoted\"?"}]', 2)
+    assert objects == [{"prompt": 'is ] a } bracket "quoted"?'}]
+
+
+def test_text_after_the_array_is_ignored():
+    objects, _ = _feed('[{"n": 1}] and later [{"n": 2}]', 4)
+    assert objects == [{"n": 1}]
+
+
+def test_python_style_dicts_are_accepted_and_bad_objects_counted():
+    objects, parser = _feed("[{'n': 1}, {\"n\": oops}, {\"n\": 3}]", 5)
+    assert objects == [{"n": 1}, {"n": 3}]
+    assert parser.failed == 1
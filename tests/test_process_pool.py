@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.process_pool import WorkerPool
+
+
+def _sleep_and_return(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+def _fail():
+    raise ValueError("bad input")
+
+
+async def _hang_and_quick(pool, quick_delay):
+    hang = asyncio.ensure_future(pool.run(_sleep_and_return, 60, "never"))
+    await asyncio.sleep(quick_delay)
+    quick = asyncio.ensure_future(pool.run(_sleep_and_return, 1.5, "done"))
+    return await asyncio.gather(hang, quick, return_exceptions=True)
+
+
+@pytest.mark.parametrize("workers, quick_delay, resubmitted", [
+    (1, 0.0, 0),  # the quick job waits for the hung one's slot
+    (2, 2.0, 1),  # the quick job is running when the hung one is killed
+])
+def test_timeout_only_fails_the_stalled_job(workers, quick_delay, resubmitted):
+    pool = WorkerPool(max_workers=workers, timeout=3.0)
+    try:
+        hang, quick = asyncio.run(_hang_and_quick(pool, quick_delay))
+    finally:
+        pool.close()
+
+    assert isinstance(hang, asyncio.TimeoutError)
+    assert quick == "done"
+    assert pool.restarts == 1
+    assert pool.resubmitted == resubmitted
+
+
+def test_job_errors_propagate_without_retry():
+    pool = WorkerPool(max_workers=1, timeout=30.0)
+    try:
+        with pytest.raises(ValueError, match="bad input"):
+            asyncio.run(pool.run(_fail))
+    finally:
+        pool.close()
+    assert pool.restarts == 0
+    assert pool.resubmitted == 0
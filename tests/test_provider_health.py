@@ -0,0 +1,86 @@
+import services.provider_health as provider_health
+from services.provider_health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _breaker(monkeypatch, **kwargs):
+    clock = FakeClock()
+    monkeypatch.setattr(provider_health.time, "monotonic", clock)
+    return CircuitBreaker("test", failure_threshold=3, cooldown=30, **kwargs), clock
+
+
+def test_opens_after_consecutive_failures(monkeypatch):
+    breaker, _ = _breaker(monkeypatch)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+
+
+def test_half_open_admits_one_probe_and_closes_on_success(monkeypatch):
+    breaker, clock = _breaker(monkeypatch)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow_request()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()  # the single probe slot is taken
+    breaker.record_success(0.5)
+    assert breaker.state == CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens(monkeypatch):
+    breaker, clock = _breaker(monkeypatch)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now += 10
+    assert not breaker.is_available()
+
+
+def test_released_probe_slot_can_be_reused(monkeypatch):
+    breaker, clock = _breaker(monkeypatch)
+    for _ in range(3):
+        breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow_request()
+    breaker.release()
+    assert breaker.allow_request()
+
+
+def test_healthy_providers_score_zero_whatever_their_speed(monkeypatch):
+    fast, _ = _breaker(monkeypatch)
+    slow, _ = _breaker(monkeypatch)
+    for _ in range(10):
+        fast.record_success(0.2)
+        slow.record_success(3.0)
+    assert fast.score() == slow.score() == 0
+
+
+def test_sustained_slowdown_and_errors_demote(monkeypatch):
+    breaker, _ = _breaker(monkeypatch)
+    for _ in range(20):
+        breaker.record_success(1.0)
+    for _ in range(10):
+        breaker.record_success(4.0)
+    assert breaker.slowdown() >= breaker.SLOW_FACTOR
+    assert breaker.score() > 0
+
+    flaky, _ = _breaker(monkeypatch)
+    flaky.record_failure()
+    assert flaky.score() == 0  # one failure is not enough
+    flaky.record_failure()
+    assert flaky.score() > 0
@@ -0,0 +1,85 @@
+import asyncio
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        return results, calls, flight.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert stats == {"in_flight": 0, "started": 1, "coalesced": 4}
+
+
+def test_exceptions_reach_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(flight.do("key", work), flight.do("key", work), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [type(r) for r in results] == [ValueError, ValueError]
+
+
+def test_cancelling_one_waiter_keeps_the_call_for_the_others():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(0.05)
+            return 42
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await started.wait()
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == (42, True)
+
+
+def test_caller_after_last_waiter_cancelled_starts_afresh():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        cancelled = []
+
+        async def slow():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def fast():
+            return 42
+
+        waiter = asyncio.ensure_future(flight.do("key", slow))
+        await started.wait()
+        waiter.cancel()
+        await asyncio.sleep(0)  # the waiter handles its cancellation
+        # Arrives before the cancelled task has finished unwinding
+        result = await flight.do("key", fast)
+        await asyncio.sleep(0)
+        return result, cancelled, flight.stats()["in_flight"]
+
+    assert asyncio.run(scenario()) == (42, [True], 0)
@@ -0,0 +1,187 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import List, Optional, Sequence, Set
+
+CHARS_PER_TOKEN = 4  # rough average for English prose
+CHUNK_CHARS = 1200
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have he her his how i if in into is it
+its may more most not of on or our she should so such than that the their them then there these they
+this those to was we were what when where which while who will with would you your
+""".split())
+
+_WORD_RE = re.compile(r"\w+")
+_TOC_LINE_RE = re.compile(r"(\.{3,}|\s)\d+\s*$")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS and len(w) > 2 and not w.isdigit()]
+
+
+def chunk_text(text: str, chunk_chars: int = CHUNK_CHARS) -> List[str]:
+    """Split text into chunks of about chunk_chars, on paragraph boundaries where possible."""
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        # Hard-wrap paragraphs that are longer than a chunk on their own
+        while len(paragraph) > chunk_chars:
+            cut = paragraph.rfind(" ", 0, chunk_chars)
+            cut = cut if cut > chunk_chars // 2 else chunk_chars
+            if current:
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            chunks.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if size + len(paragraph) > chunk_chars and current:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph) + 2
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _boilerplate_penalty(chunk: str) -> float:
+    """0..1 share of lines that look like a table of contents or index."""
+    lines = [line for line in chunk.splitlines() if line.strip()]
+    if not lines:
+        return 1.0
+    return sum(1 for line in lines if _TOC_LINE_RE.search(line)) / len(lines)
+
+
+class ContextSelector:
+    """Pick the most informative chunks of a document for a token budget.
+
+    Chunks are scored with BM25 against the query terms (a topic, file
+    name, ...). When the query matches nothing, chunks are scored by how
+    central their vocabulary is to the whole document (TF-IDF weight of
+    the document's key terms), so introductions and boilerplate lose to
+    substantive sections. Selection is greedy with a redundancy penalty
+    (maximal marginal relevance) plus a bonus for document regions not yet
+    covered, so a quiz draws from the whole text rather than its first
+    chapter. The chosen chunks are returned in document order.
+    """
+
+    K1 = 1.5
+    B = 0.75
+    REDUNDANCY_WEIGHT = 0.5
+    COVERAGE_WEIGHT = 0.3
+    REGIONS = 8  # document is split into this many regions for the coverage bonus
+
+    def __init__(self, text: str, chunk_chars: int = CHUNK_CHARS):
+        self.chunks = chunk_text(text, chunk_chars)
+        self._terms = [_terms(chunk) for chunk in self.chunks]
+        self._counts = [Counter(terms) for terms in self._terms]
+        self._sets = [set(counts) for counts in self._counts]
+        self._doc_freq: Counter = Counter()
+        for term_set in self._sets:
+            self._doc_freq.update(term_set)
+        lengths = [len(terms) for terms in self._terms]
+        self._avg_len = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    def _idf(self, term: str) -> float:
+        n = len(self.chunks)
+        df = self._doc_freq.get(term, 0)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _bm25(self, index: int, query: Sequence[str]) -> float:
+        counts = self._counts[index]
+        length = len(self._terms[index]) or 1
+        norm = self.K1 * (1 - self.B + self.B * length / (self._avg_len or 1))
+        score = 0.0
+        for term in query:
+            tf = counts.get(term, 0)
+            if tf:
+                score += self._idf(term) * tf * (self.K1 + 1) / (tf + norm)
+        return score
+
+    def _centrality(self, index: int, key_terms: Set[str]) -> float:
+        counts = self._counts[index]
+        length = len(self._terms[index]) or 1
+        return sum(math.log1p(counts[t]) * self._idf(t) for t in key_terms if t in counts) / math.sqrt(length)
+
+    def _key_terms(self, limit: int = 50) -> Set[str]:
+        # Terms frequent overall but not present in every chunk carry the subject matter
+        totals: Counter = Counter()
+        for counts in self._counts:
+            totals.update(counts)
+        weighted = {t: c * self._idf(t) for t, c in totals.items() if self._doc_freq[t] > 1}
+        return set(sorted(weighted, key=weighted.get, reverse=True)[:limit])
+
+    def scores(self, query: str = "") -> List[float]:
+        query_terms = list(dict.fromkeys(_terms(query)))
+        raw = [self._bm25(i, query_terms) for i in range(len(self.chunks))] if query_terms else []
+        if not any(raw):
+            key_terms = self._key_terms()
+            raw = [self._centrality(i, key_terms) for i in range(len(self.chunks))]
+        top = max(raw) if raw else 0.0
+        return [
+            (score / top if top else 0.0) * (1 - _boilerplate_penalty(chunk))
+            for score, chunk in zip(raw, self.chunks)
+        ]
+
+    def select(self, query: str = "", budget_tokens: int = 2000) -> List[int]:
+        """Indices of the chunks to send, in document order."""
+        if not self.chunks:
+            return []
+        scores = self.scores(query)
+        n = len(self.chunks)
+        region = [i * self.REGIONS // n for i in range(n)]
+        redundancy = [0.0] * n  # highest overlap with any chunk selected so far
+        covered: Set[int] = set()
+        selected: List[int] = []
+        used = 0
+        candidates = set(range(n))
+        while candidates and used < budget_tokens:
+            best = max(candidates, key=lambda i: scores[i]
+                       - self.REDUNDANCY_WEIGHT * redundancy[i]
+                       + (0.0 if region[i] in covered else self.COVERAGE_WEIGHT))
+            candidates.discard(best)
+            cost = estimate_tokens(self.chunks[best])
+            if used + cost > budget_tokens:
+                if not selected:
+                    # Nothing fits yet; the best chunk is sent truncated
+                    selected.append(best)
+                    break
+                continue
+            selected.append(best)
+            used += cost
+            covered.add(region[best])
+            for i in candidates:
+                union = len(self._sets[i] | self._sets[best])
+                if union:
+                    redundancy[i] = max(redundancy[i], len(self._sets[i] & self._sets[best]) / union)
+        return sorted(selected)
+
+    def select_text(self, query: str = "", budget_tokens: int = 2000) -> str:
+        picked = [self.chunks[i] for i in self.select(query, budget_tokens)]
+        text = "\n\n[...]\n\n".join(picked)
+        return text[:budget_tokens * CHARS_PER_TOKEN]
+
+
+def filename_query(filename: Optional[str]) -> str:
+    """Words of an upload's file name, used as the relevance query for its content."""
+    stem = os.path.splitext(filename or "")[0]
+    return re.sub(r"[_\-.]+", " ", stem)
+
+
+def select_context(text: str, query: Optional[str] = "", budget_tokens: int = 2000) -> str:
+    """Most relevant parts of text that fit in budget_tokens.
+
+    Text that already fits is returned unchanged.
+    """
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+    return ContextSelector(text).select_text(query or "", budget_tokens)
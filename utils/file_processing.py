@@ -1,31 +1,141 @@
 import io
-from pypdf import PdfReader
-import docx
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-def extract_text_from_file(filename: str, file_content: bytes) -> str:
-    """Extract text from PDF, DOCX, or TXT files."""
+# These functions run inside extraction worker processes (see
+# services/file_service.py), so they must stay importable and picklable
+# without pulling in the web app.
+
+
+def extract_document(filename: str, file_content: bytes, max_pages: Optional[int] = None,
+                     char_budget: Optional[int] = None, page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """Extract text plus details about how it was extracted.
+
+    Returns {"text", "engine", "pages", "total_pages"}. For PDFs:
+    - max_pages caps how many pages are read;
+    - char_budget stops reading once that much text has been collected,
+      taking pages spread across the whole document rather than just the
+      first ones (for prompts, which only need a budget of salient text);
+    - page_range=(start, end) extracts only those pages (used to split a
+      full extraction across worker processes).
+    Raises ValueError for unsupported or unreadable files.
+    """
     ext = filename.split('.')[-1].lower()
-    
+
     if ext == 'pdf':
-        return _extract_pdf(file_content)
-    elif ext == 'docx':
-        return _extract_docx(file_content)
+        return _extract_pdf(file_content, max_pages, char_budget, page_range)
+    elif ext in ('docx', 'doc'):
+        return {"text": _extract_docx(file_content), "engine": "docx", "pages": None, "total_pages": None}
     elif ext == 'txt':
-        return file_content.decode('utf-8', errors='ignore')
+        text = file_content.decode('utf-8', errors='ignore')
+        return {"text": text, "engine": "text", "pages": None, "total_pages": None}
     else:
         raise ValueError(f"Unsupported file format: {ext}")
 
-def _extract_pdf(content: bytes) -> str:
+
+def extract_document_file(path: str, filename: str, max_pages: Optional[int] = None,
+                          char_budget: Optional[int] = None, page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    """extract_document() for a file on disk, so workers read it themselves."""
+    with open(path, 'rb') as f:
+        content = f.read()
+    return extract_document(filename, content, max_pages, char_budget, page_range)
+
+
+def count_pdf_pages_file(path: str) -> int:
+    with open(path, 'rb') as f:
+        return count_pdf_pages(f.read())
+
+
+def count_pdf_pages(file_content: bytes) -> int:
     try:
-        reader = PdfReader(io.BytesIO(content))
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        return _open_pdf(file_content)[1]
     except Exception as e:
         raise ValueError(f"Failed to read PDF: {str(e)}")
 
+
+def _open_pdf(content: bytes) -> Tuple[str, int, Callable[[int], str]]:
+    """(engine, page count, page -> text), using PyMuPDF when it is installed."""
+    try:
+        import fitz  # PyMuPDF: several times faster than pypdf
+        doc = fitz.open(stream=content, filetype="pdf")
+        return "pymupdf", doc.page_count, lambda i: doc.load_page(i).get_text()
+    except ImportError:
+        pass
+    except Exception:
+        # Some files PyMuPDF rejects still open in pypdf
+        pass
+
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(content))
+    return "pypdf", len(reader.pages), lambda i: reader.pages[i].extract_text()
+
+
+def _coverage_order(count: int) -> List[int]:
+    """Page indices ordered so every prefix is spread evenly over the document.
+
+    0, n/2, n/4, 3n/4, n/8, ... - stopping anywhere still samples the whole
+    document instead of its front matter.
+    """
+    order: List[int] = []
+    seen = set()
+    step = count
+    while step >= 1:
+        for i in range(0, count, step):
+            if i not in seen:
+                seen.add(i)
+                order.append(i)
+        step //= 2
+    return order
+
+
+def _extract_pdf(content: bytes, max_pages: Optional[int] = None, char_budget: Optional[int] = None,
+                 page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+    try:
+        engine, total, page_text = _open_pdf(content)
+    except Exception as e:
+        raise ValueError(f"Failed to read PDF: {str(e)}")
+
+    if page_range is not None:
+        first, last = max(0, page_range[0]), min(total, page_range[1])
+        pages = list(range(first, last))
+    else:
+        pages = list(range(total if max_pages is None else min(total, max_pages)))
+    if char_budget is not None:
+        pages = [pages[i] for i in _coverage_order(len(pages))]
+
+    parts = []
+    collected = 0
+    read = 0
+    try:
+        for i in pages:
+            extracted = page_text(i)
+            read += 1
+            if extracted and extracted.strip():
+                parts.append((i, extracted.strip()))
+                collected += len(parts[-1][1])
+            if char_budget is not None and collected >= char_budget:
+                break
+    except Exception as e:
+        if not parts:
+            raise ValueError(f"Failed to read PDF: {str(e)}")
+
+    text = "\n\n".join(part for _, part in sorted(parts))
+    if page_range is None and not text.strip():
+        raise ValueError("Empty PDF or scanned image. Please use a text-based PDF.")
+    return {"text": text, "engine": engine, "pages": read, "total_pages": total}
+
+
 def _extract_docx(content: bytes) -> str:
+    try:
+        import docx2txt
+        # docx2txt also picks up tables, headers and footers
+        return docx2txt.process(io.BytesIO(content))
+    except ImportError:
+        pass
+    except Exception as e:
+        raise ValueError(f"Failed to read DOCX: {str(e)}")
+
+    import docx
     try:
         doc = docx.Document(io.BytesIO(content))
         return "\n".join([para.text for para in doc.paragraphs])
@@ -0,0 +1,83 @@
+import ast
+import json
+from typing import Any, Dict, List
+
+
+class JSONArrayStreamParser:
+    """Incrementally extract the objects of a JSON array from streamed text.
+
+    feed() takes arbitrary text chunks (markdown fences and chatter around
+    the array are skipped; a `[` only opens the array when the next
+    non-space character is `{`, so brackets in chatter such as "[5]" are
+    passed over) and returns every object of the top-level array
+    that became complete with that chunk, so callers can act on question 1
+    while the model is still writing question 2.
+    """
+
+    def __init__(self):
+        self._started = False
+        self._bracket = False  # saw a `[`, waiting to see whether `{` follows
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._current: List[str] = []
+        self.failed = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        objects = []
+        for ch in chunk:
+            if self._finished:
+                break
+            if not self._started:
+                if not self._bracket or ch.isspace():
+                    self._bracket = self._bracket or ch == '['
+                    continue
+                self._bracket = ch == '['
+                if ch != '{':
+                    continue
+                self._started = True
+                self._depth = 1
+
+            capturing = self._depth >= 2
+            if capturing:
+                self._current.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '[{':
+                if self._depth == 1 and ch == '{':
+                    self._current = ['{']
+                self._depth += 1
+            elif ch in ']}':
+                self._depth -= 1
+                if self._depth == 1 and ch == '}':
+                    obj = self._decode(''.join(self._current))
+                    if obj is not None:
+                        objects.append(obj)
+                    self._current = []
+                elif self._depth <= 0:
+                    # End of the array; ignore anything after it
+                    self._finished = True
+        return objects
+
+    def _decode(self, text: str):
+        try:
+            value = json.loads(text)
+        except ValueError:
+            try:
+                # Models sometimes emit Python-style single-quoted dicts
+                value = ast.literal_eval(text)
+            except (ValueError, SyntaxError):
+                self.failed += 1
+                return None
+        return value if isinstance(value, dict) else None
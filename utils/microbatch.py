@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+
+class MicroBatcher:
+    """Group compatible calls that arrive within a short window into one batch.
+
+    submit(group, item) parks the caller on a future. The first item of a
+    group starts a `window`-second timer; when it fires, or when the group
+    reaches max_size, run_batch(group, items) is called once with every
+    parked item and must return one result (or exception) per item, in
+    order. Those are handed back to the individual callers.
+    """
+
+    def __init__(self, run_batch: Callable[[Hashable, List[Any]], Awaitable[List[Any]]],
+                 window: float = 0.05, max_size: int = 8):
+        self._run_batch = run_batch
+        self.window = window
+        self.max_size = max_size
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self.batches = 0
+        self.batched_items = 0
+
+    async def submit(self, group: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(group, [])
+        pending.append((item, future))
+        if len(pending) >= self.max_size:
+            self._flush(group)
+        elif group not in self._timers:
+            self._timers[group] = loop.call_later(self.window, self._flush, group)
+        return await future
+
+    def _flush(self, group: Hashable):
+        timer = self._timers.pop(group, None)
+        if timer is not None:
+            timer.cancel()
+        entries = [(item, fut) for item, fut in self._pending.pop(group, []) if not fut.cancelled()]
+        if entries:
+            asyncio.ensure_future(self._run(group, entries))
+
+    async def _run(self, group: Hashable, entries: List[Tuple[Any, asyncio.Future]]):
+        self.batches += 1
+        self.batched_items += len(entries)
+        try:
+            results = await self._run_batch(group, [item for item, _ in entries])
+        except Exception as e:
+            results = [e] * len(entries)
+        for (_, future), result in zip(entries, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "batches": self.batches,
+            "batched_items": self.batched_items,
+            "pending": sum(len(items) for items in self._pending.values()),
+        }
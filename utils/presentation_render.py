@@ -0,0 +1,231 @@
+import io
+from typing import Any, Dict, Optional, Tuple
+
+# These renderers run inside render worker processes (see
+# services/render_service.py), so they must stay importable and picklable
+# without pulling in the web app. The renderer libraries (fpdf,
+# python-docx, python-pptx) are imported inside the functions so they only
+# load in the workers. Every renderer returns the document as bytes.
+# Styled base templates are built once per worker (precompile_templates)
+# and each render loads a copy.
+
+MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+}
+
+
+def render_document(fmt: str, content: Dict[str, Any], options: Dict[str, Any]) -> bytes:
+    """Render AI notes content as a pdf, docx or pptx (the default) document.
+
+    options holds the request's topic, theme and font_style.
+    """
+    if fmt == "pdf":
+        return generate_pdf_notes(content, options["topic"])
+    elif fmt == "docx":
+        return generate_docx_notes(content, options["topic"])
+    return generate_pptx_slides(content, options)
+
+
+# --- 1. PDF GENERATOR ---
+_notes_pdf_class = None
+
+def get_notes_pdf_class():
+    global _notes_pdf_class
+    if _notes_pdf_class is None:
+        from fpdf import FPDF
+
+        class NotesPDF(FPDF):
+            def header(self):
+                self.set_font('Arial', 'B', 12)
+                self.cell(0, 10, 'Smart Notes by QuizAI', 0, 1, 'R')
+                self.ln(5)
+
+            def footer(self):
+                self.set_y(-15)
+                self.set_font('Arial', 'I', 8)
+                self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+        _notes_pdf_class = NotesPDF
+    return _notes_pdf_class
+
+def generate_pdf_notes(content, topic) -> bytes:
+    pdf = get_notes_pdf_class()()
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+
+    # Title
+    pdf.set_font('Arial', 'B', 24)
+    pdf.set_text_color(33, 33, 33)
+    pdf.multi_cell(0, 10, topic.upper(), align='C')
+    pdf.ln(10)
+
+    # Content Loop
+    slides = content.get("slides", [])
+    for slide in slides:
+        title = slide.get("title", "Section")
+        points = slide.get("content", [])
+
+        # Section Title
+        pdf.set_font('Arial', 'B', 16)
+        pdf.set_text_color(108, 74, 227) # Purple
+        pdf.cell(0, 10, title, 0, 1)
+        pdf.ln(2)
+
+        # Content
+        pdf.set_font('Arial', '', 12)
+        pdf.set_text_color(50, 50, 50)
+        for point in points:
+            # Bullet point
+            pdf.multi_cell(0, 8, f"{chr(149)} {point}")
+        pdf.ln(5)
+
+    # PyFPDF returns a latin-1 str, fpdf2 a bytearray
+    output = pdf.output(dest='S')
+    if isinstance(output, str):
+        output = output.encode('latin-1')
+    return bytes(output)
+
+# --- 2. DOCX GENERATOR ---
+DOCX_STYLES = ("Title", "Heading 1", "List Bullet")
+
+_docx_template: Optional[bytes] = None
+_docx_style_ids: Dict[str, str] = {}
+
+def get_docx_template() -> bytes:
+    """Base document with the title style pre-centred, built once per process."""
+    global _docx_template
+    if _docx_template is None:
+        from docx import Document
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+        doc = Document()
+        doc.styles['Title'].paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        # python-docx rescans styles.xml on every styled paragraph; look the ids up once
+        _docx_style_ids.update({name: doc.styles[name].style_id for name in DOCX_STYLES})
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        _docx_template = buffer.getvalue()
+    return _docx_template
+
+def generate_docx_notes(content, topic) -> bytes:
+    from docx import Document
+
+    doc = Document(io.BytesIO(get_docx_template()))
+
+    def add(text, style_name):
+        doc.add_paragraph(text)._p.style = _docx_style_ids[style_name]
+
+    # Title
+    add(topic, "Title")
+
+    slides = content.get("slides", [])
+    for slide in slides:
+        title_text = slide.get("title", "Section")
+        points = slide.get("content", [])
+
+        # Section Header
+        add(title_text, "Heading 1")
+
+        # Content
+        for point in points:
+            add(point, "List Bullet")
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+# --- 3. PPTX GENERATOR ---
+# Theme Setup
+theme_map = {
+    "Modern": {"title_color": (31, 73, 125), "accent": (236, 72, 153)},
+    "Creative": {"title_color": (255, 105, 180), "accent": (138, 43, 226)},
+    "Professional": {"title_color": (0, 51, 102), "accent": (0, 102, 204)},
+    "Dark": {"title_color": (80, 80, 80), "accent": (0, 255, 127)},
+    "Gradient": {"title_color": (112, 56, 246), "accent": (255, 126, 95)},
+}
+PPTX_FONTS = ("Arial", "Calibri")
+SUBTITLE = "Generated by Smart Notes AI"
+
+_pptx_templates: Dict[Tuple[str, str], bytes] = {}
+
+def get_pptx_template(theme: str, font: str) -> bytes:
+    """Themed base deck, built once per process.
+
+    Title and body styles are baked into the layouts' list styles, and the
+    title slide with its subtitle is already in place, so rendering only
+    fills in text.
+    """
+    key = (theme, font)
+    if key not in _pptx_templates:
+        from pptx import Presentation
+
+        prs = Presentation()
+        title_color = "%02X%02X%02X" % theme_map[theme]["title_color"]
+        title_layout, content_layout = prs.slide_layouts[0], prs.slide_layouts[1]
+        _bake_text_style(title_layout.placeholders.get(0), 5400, bold=True, color=title_color, font=font)
+        _bake_text_style(content_layout.placeholders.get(0), 4000, bold=True, color=title_color, font=font)
+        _bake_text_style(content_layout.placeholders.get(1), 2400)
+
+        slide = prs.slides.add_slide(title_layout)
+        slide.placeholders[1].text = SUBTITLE
+
+        buffer = io.BytesIO()
+        prs.save(buffer)
+        _pptx_templates[key] = buffer.getvalue()
+    return _pptx_templates[key]
+
+def _bake_text_style(placeholder, size: int, bold: bool = False, color: Optional[str] = None,
+                     font: Optional[str] = None):
+    """Set a layout placeholder's first-level text style (size in 1/100 pt)."""
+    from pptx.oxml import parse_xml
+    from pptx.oxml.ns import nsdecls, qn
+
+    lst_style = placeholder._element.txBody.find(qn("a:lstStyle"))
+    for old in lst_style.findall(qn("a:lvl1pPr")):
+        lst_style.remove(old)
+    fill = f'<a:solidFill><a:srgbClr val="{color}"/></a:solidFill>' if color else ''
+    latin = f'<a:latin typeface="{font}"/>' if font else ''
+    weight = ' b="1"' if bold else ''
+    level = parse_xml(
+        f'<a:lvl1pPr {nsdecls("a")}><a:defRPr sz="{size}"{weight}>{fill}{latin}</a:defRPr></a:lvl1pPr>'
+    )
+    lst_style.insert(1 if lst_style.find(qn("a:defPPr")) is not None else 0, level)
+
+def precompile_templates():
+    """Build every themed deck and the DOCX base up front (render worker initializer)."""
+    try:
+        for theme in theme_map:
+            for font in PPTX_FONTS:
+                get_pptx_template(theme, font)
+        get_docx_template()
+    except Exception as e:
+        # Renders fall back to building templates on first use
+        print(f"Template precompile failed: {e}")
+
+def generate_pptx_slides(content, options) -> bytes:
+    from pptx import Presentation
+
+    theme = options.get("theme") if options.get("theme") in theme_map else "Modern"
+    font_style = options.get("font_style")
+    theme_font = font_style if font_style in PPTX_FONTS else "Arial" # Basic font fallback
+    prs = Presentation(io.BytesIO(get_pptx_template(theme, theme_font)))
+
+    # Title Slide (already in the template)
+    prs.slides[0].shapes.title.text = options["topic"]
+
+    # Loop Slides
+    layout = prs.slide_layouts[1]
+    for slide_data in content.get("slides", []):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = slide_data.get("title", "")
+
+        tf = slide.placeholders[1].text_frame
+        for i, point in enumerate(slide_data.get("content", [])):
+            p = tf.paragraphs[0] if i == 0 else tf.add_paragraph()
+            p.text = str(point)
+
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
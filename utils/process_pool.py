@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+
+class WorkerPool:
+    """Spawn process pool for CPU-bound jobs, recycled when a job gets stuck.
+
+    The pool starts on the first job (spawn avoids forking the server's
+    threads); `initializer` runs once in every worker. At most max_workers
+    jobs are handed to the pool at a time, the rest wait their turn, so
+    run() limits each job's own running time to `timeout` seconds. On
+    timeout the workers are terminated, the pool is replaced and
+    asyncio.TimeoutError is raised for that job.
+
+    Other jobs caught in a recycle (killed mid-run or still queued) are not
+    failed; they are resubmitted to the fresh pool. If a worker dies on its
+    own (BrokenProcessPool, e.g. out of memory) the job is retried too. A job
+    is submitted at most MAX_ATTEMPTS times before BrokenProcessPool is
+    raised. Errors raised by the job itself propagate unchanged.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, max_workers: int, timeout: float, initializer: Optional[Callable[[], None]] = None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._initializer = initializer
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.restarts = 0
+        self.resubmitted = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self._initializer
+            )
+        return self._pool
+
+    def reset(self, pool: Optional[ProcessPoolExecutor] = None):
+        """Terminate the workers and start a fresh pool on the next job.
+
+        With `pool`, only recycle if it is still the current pool, so jobs
+        failing together recycle it once.
+        """
+        if pool is not None and pool is not self._pool:
+            return
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        self.restarts += 1
+        for process in list(getattr(pool, "_processes", {}).values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        async with self._slots:
+            return await self._run_with_retries(func, *args)
+
+    async def _run_with_retries(self, func: Callable[..., Any], *args) -> Any:
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            pool = self._get_pool()
+            job = pool.submit(func, *args)
+            future = asyncio.wrap_future(job)
+            try:
+                # wait() reports a job cancelled by a recycle instead of raising
+                done, _ = await asyncio.wait({future}, timeout=self.timeout)
+            except asyncio.CancelledError:
+                job.cancel()
+                raise
+            if not done:
+                self.reset(pool)
+                raise asyncio.TimeoutError()
+            if future.cancelled():
+                # Still queued when another job's timeout recycled the pool
+                error = BrokenProcessPool("Worker pool was recycled")
+            else:
+                error = future.exception()
+                if not isinstance(error, BrokenProcessPool):
+                    return future.result()
+                # A worker died, or was killed by another job's recycle
+                self.reset(pool)
+            if attempt == self.MAX_ATTEMPTS:
+                raise error
+            self.resubmitted += 1
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,55 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one in-flight call.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it runs await the same task and share its result (or exception).
+    A caller that is cancelled only stops waiting - the shared task keeps
+    running for the others, and is cancelled only once every waiter is gone.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._calls.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] <= 0:
+                    # Forget the task before cancelling it, so a caller
+                    # arriving before the done callback runs starts afresh
+                    # instead of joining a cancelled task
+                    del self._calls[key]
+                    del self._waiters[key]
+                    task.cancel()
+            raise
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            self._waiters.pop(key, None)
+        # Mark the exception as retrieved; waiters re-raise it themselves.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": len(self._calls), "started": self.started, "coalesced": self.coalesced}
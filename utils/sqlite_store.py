@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+
+class ThreadedStore:
+    """Base for stores whose blocking I/O runs on one dedicated worker thread.
+
+    Subclasses keep their storage methods synchronous and call them through
+    _run(), so the event loop never blocks on file I/O or fsync and the
+    underlying handles are only ever touched by that one thread.
+    """
+
+    def __init__(self, thread_name: str):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=thread_name)
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class SQLiteStore(ThreadedStore):
+    """ThreadedStore owning one long-lived SQLite connection in WAL mode.
+
+    The connection is opened on first use by _connect(), which calls
+    _create_schema(conn) once. WAL with synchronous=NORMAL only fsyncs on
+    checkpoint, trading the last few writes on power loss for flat write
+    latency. ISOLATION_LEVEL is passed to sqlite3.connect (None means
+    autocommit with explicit BEGIN/COMMIT).
+    """
+
+    ISOLATION_LEVEL: Optional[str] = ""
+
+    def __init__(self, db_path: str, thread_name: str):
+        super().__init__(thread_name)
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=self.ISOLATION_LEVEL)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._create_schema(conn)
+            self._conn = conn
+        return self._conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        """Create tables and indexes (runs on the store thread)."""
+
+    def _close_sync(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def close(self):
+        await self._run(self._close_sync)
+        await super().close()
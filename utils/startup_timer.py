@@ -0,0 +1,32 @@
+import os
+import time
+from typing import Dict
+
+
+class StartupTimer:
+    """Wall-clock milestones from process import to a ready worker.
+
+    The timer starts when this module is first imported, so main_web
+    imports it before anything else. mark() records the elapsed time of a
+    named milestone; report() prints and returns them for this worker.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str) -> float:
+        elapsed = time.perf_counter() - self.started
+        self.marks[name] = round(elapsed, 3)
+        return elapsed
+
+    def report(self) -> Dict[str, float]:
+        steps = ", ".join(f"{name}={elapsed:.2f}s" for name, elapsed in self.marks.items())
+        print(f"⏱️ Startup timing (pid {os.getpid()}): {steps}")
+        return dict(self.marks)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {"pid": os.getpid(), **self.marks}
+
+
+startup_timer = StartupTimer()